@@ -0,0 +1,128 @@
+import collections
+import threading
+import time
+
+
+class CommandStats(object):
+    """ Counters and latency (submit to completion, in seconds) of one command name."""
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, latency):
+        self.sent += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def mean_latency(self):
+        return self.total_latency / self.sent if self.sent else 0.0
+
+
+class CommandScheduler(object):
+    """ Runs drone commands one at a time on a single worker thread.
+        Movement intents are submitted into a slot (e.g. 'horizontal'); a newer
+        intent replaces the one still pending in the same slot, so the drone only
+        ever executes the latest wish per axis and at most one intent per slot waits.
+        Priority commands (takeoff, land) jump the queue and discard all pending
+        movement, but still wait for the command in flight to finish. emergency()
+        does not wait: it runs on the caller's thread straight away.
+    """
+
+    def __init__(self):
+        self.stats = collections.defaultdict(CommandStats)
+
+        self._cond = threading.Condition()
+        self._priority = collections.deque()
+        self._pending = collections.OrderedDict()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """ Stop the worker after the command in flight; pending commands are discarded."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, slot, name, function, *args):
+        """ Queue a movement intent, superseding the pending one of the same slot."""
+        with self._cond:
+            if slot in self._pending:
+                self.stats[self._pending[slot][0]].dropped += 1
+            self._pending[slot] = (name, function, args, time.monotonic())
+            self._cond.notify()
+
+    def submit_priority(self, name, function, *args):
+        """ Queue a command ahead of all movement and discard the pending movement."""
+        with self._cond:
+            for pending in self._pending.values():
+                self.stats[pending[0]].dropped += 1
+            self._pending.clear()
+            self._priority.append((name, function, args, time.monotonic()))
+            self._cond.notify()
+
+    def emergency(self, name, function, *args):
+        """ Discard everything queued and run function now on the calling thread.
+            Meant for commands that need no reply, like Tello.emergency, so it cannot
+            steal the answer of the command in flight.
+        """
+        with self._cond:
+            for pending in list(self._priority) + list(self._pending.values()):
+                self.stats[pending[0]].dropped += 1
+            self._priority.clear()
+            self._pending.clear()
+        submitted = time.monotonic()
+        try:
+            function(*args)
+        except Exception as e:
+            self.stats[name].failed += 1
+            print("Command {} failed: {}".format(name, e))
+            return
+        self.stats[name].record(time.monotonic() - submitted)
+
+    def pending(self):
+        with self._cond:
+            return len(self._priority) + len(self._pending)
+
+    def report(self):
+        """ One line per command name with its counters and latencies."""
+        lines = []
+        for name, stats in sorted(self.stats.items()):
+            lines.append("{:<16} sent {:5d}  dropped {:5d}  failed {:3d}  latency mean {:6.1f} ms  max {:6.1f} ms".format(
+                name, stats.sent, stats.dropped, stats.failed,
+                stats.mean_latency() * 1000, stats.max_latency * 1000))
+        return "\n".join(lines)
+
+    def _next(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._running or self._priority or self._pending)
+            if not self._running:
+                return None
+            if self._priority:
+                return self._priority.popleft()
+            _, command = self._pending.popitem(last=False)
+            return command
+
+    def _work(self):
+        while True:
+            command = self._next()
+            if command is None:
+                break
+            name, function, args, submitted = command
+            try:
+                function(*args)
+            except Exception as e:
+                self.stats[name].failed += 1
+                print("Command {} failed: {}".format(name, e))
+                continue
+            self.stats[name].record(time.monotonic() - submitted)
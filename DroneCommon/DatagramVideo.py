@@ -0,0 +1,137 @@
+import heapq
+import random
+import struct
+import threading
+import time
+
+# Every datagram carries one fragment of a protocol message:
+# magic, frame seq, fragment index, fragment count
+FRAGMENT = struct.Struct("<2sIHH")
+MAGIC = b'DF'
+MAX_PAYLOAD = 1400  # Keeps header + payload + IP/UDP headers under a 1500 byte Ethernet MTU
+
+
+def fragment(seq, message, max_payload=MAX_PAYLOAD):
+    """ Split a message into datagrams that can be reassembled by FrameReassembler."""
+    count = max(1, (len(message) + max_payload - 1) // max_payload)
+    if count > 0xFFFF:
+        raise ValueError(f"Message of {len(message)} bytes needs too many fragments")
+    view = memoryview(message)
+    return [FRAGMENT.pack(MAGIC, seq & 0xFFFFFFFF, index, count) + view[index * max_payload:(index + 1) * max_payload]
+            for index in range(count)]
+
+
+class FrameReassembler(object):
+    """ Puts fragmented frames back together on the receiving side.
+        Only moving forward matters for live video: a frame is delivered as soon as all its fragments arrived,
+        anything older than the last delivered frame is discarded, and a frame still incomplete after `deadline`
+        seconds is given up on instead of waiting for fragments that were probably lost.
+    """
+
+    def __init__(self, deadline=0.1):
+        self.deadline = deadline
+        self.pending = {}  # seq -> [first arrival time, fragment count, {index: data}]
+        self.last_seq = -1
+
+        self.completed = 0
+        self.expired = 0  # incomplete when the deadline passed
+        self.superseded = 0  # incomplete when a newer frame was delivered
+        self.late = 0  # fragments of frames that were already delivered or dropped
+        self.invalid = 0
+
+    def add(self, datagram):
+        """ Feed one datagram. Returns (seq, message bytes) when it completes a frame, otherwise None."""
+        now = time.monotonic()
+        self.expire(now)
+        if len(datagram) < FRAGMENT.size:
+            self.invalid += 1
+            return None
+        magic, seq, index, count = FRAGMENT.unpack_from(datagram)
+        if magic != MAGIC or index >= count:
+            self.invalid += 1
+            return None
+        if seq <= self.last_seq:
+            self.late += 1
+            return None
+
+        entry = self.pending.get(seq)
+        if entry is None:
+            entry = self.pending[seq] = [now, count, {}]
+        entry[2][index] = bytes(datagram[FRAGMENT.size:])
+        if len(entry[2]) < entry[1]:
+            return None
+
+        # Complete: deliver it and give up on every older frame still waiting
+        del self.pending[seq]
+        for older in [pending_seq for pending_seq in self.pending if pending_seq < seq]:
+            del self.pending[older]
+            self.superseded += 1
+        self.last_seq = seq
+        self.completed += 1
+        fragments = entry[2]
+        return seq, b''.join(fragments[i] for i in range(entry[1]))
+
+    def expire(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        for seq in [seq for seq, entry in self.pending.items() if now - entry[0] > self.deadline]:
+            del self.pending[seq]
+            self.expired += 1
+
+    def report(self):
+        return (f"{self.completed} frames completed, {self.expired} expired, {self.superseded} superseded, "
+                f"{self.late} late fragments")
+
+
+class LossyChannel(object):
+    """ Stands in for a UDP socket's sendto and drops, delays and reorders datagrams.
+        Used to test the datagram transport over loopback as if it ran over a bad Wi-Fi link.
+    """
+
+    def __init__(self, sock, loss=0.0, delay=0.0, jitter=0.0, seed=None):
+        self.sock = sock
+        self.loss = loss  # probability of dropping a datagram
+        self.delay = delay  # base one-way delay in seconds
+        self.jitter = jitter  # extra random delay in seconds, reorders datagrams
+        self.random = random.Random(seed)
+        self.lost = 0
+        self.sent = 0
+
+        self._queue = []
+        self._counter = 0
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._deliver, daemon=True)
+        self._thread.start()
+
+    def sendto(self, data, addr):
+        if self.random.random() < self.loss:
+            self.lost += 1
+            return len(data)
+        due = time.monotonic() + self.delay + self.random.uniform(0.0, self.jitter)
+        with self._cond:
+            self._counter += 1
+            heapq.heappush(self._queue, (due, self._counter, bytes(data), addr))
+            self._cond.notify()
+        return len(data)
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self.sock.close()
+
+    def _deliver(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    self._cond.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                if not self._running:
+                    return
+                _, _, data, addr = heapq.heappop(self._queue)
+            try:
+                self.sock.sendto(data, addr)
+                self.sent += 1
+            except OSError:
+                pass  # Full buffer or unreachable peer, exactly what a real link would do
@@ -0,0 +1,46 @@
+import sys
+
+import cv2
+import numpy as np
+import pygame
+
+# 24 bit surface masks that put the channels in memory in the given order
+if sys.byteorder == 'little':
+    MASKS = {'RGB': (0x0000FF, 0x00FF00, 0xFF0000, 0), 'BGR': (0xFF0000, 0x00FF00, 0x0000FF, 0)}
+else:
+    MASKS = {'RGB': (0xFF0000, 0x00FF00, 0x0000FF, 0), 'BGR': (0x0000FF, 0x00FF00, 0xFF0000, 0)}
+
+
+class DisplaySink(object):
+    """ Shows frames in a pygame window without allocating a new buffer per frame.
+        The sink owns one surface whose pixels are laid out like the caller's frames (RGB or BGR), so a frame is
+        copied, or resized, straight into the surface memory and overlays are drawn there with the usual cv2 calls.
+        The source frame is never modified, so a frame shared with other threads needs no defensive copy.
+    """
+
+    def __init__(self, screen, order='RGB', interpolation=cv2.INTER_LINEAR):
+        self.screen = screen
+        self.size = screen.get_size()
+        self.order = order  # Channel order of the frames passed to show()
+        self.interpolation = interpolation  # Used when a frame does not match the window size
+        self.surface = pygame.Surface(self.size, 0, 24, MASKS[order])
+        self.frames = 0
+
+    def show(self, frame, overlay=None):
+        """ Display frame. overlay, if given, is called with the (height, width, 3) pixel view to draw on."""
+        # The view locks the surface, it must be gone again before the blit
+        canvas = pygame.surfarray.pixels3d(self.surface).swapaxes(0, 1)
+        if self.order == 'BGR':
+            canvas = canvas[..., ::-1]  # pixels3d always indexes R, G, B; this view follows the memory order
+        try:
+            if frame.shape[:2] == canvas.shape[:2]:
+                np.copyto(canvas, frame)
+            else:
+                cv2.resize(frame, self.size, dst=canvas, interpolation=self.interpolation)
+            if overlay is not None:
+                overlay(canvas)
+        finally:
+            del canvas
+        self.screen.blit(self.surface, (0, 0))
+        pygame.display.update()
+        self.frames += 1
@@ -0,0 +1,149 @@
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from DroneCommon.FrameSource import FrameSource
+
+
+class BusFrame(object):
+    """ One camera frame and the images derived from it, shared read-only by every consumer.
+        display is the BGR frame at display size, model_input the letterboxed RGB detector input. A consumer
+        gets the frame from FrameBus.wait() and calls release() when done with it; once nobody holds it any
+        more its buffers go back to the bus and are reused for a later frame.
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.refs = 0
+        self.seq = 0
+        self.timestamp = None
+        self.captured = None  # time.monotonic() when the frame reader produced the frame, as FrameTracer uses
+        self.converted = None  # time.monotonic() when the bus finished converting it
+        self.display = None
+        self.model_input = np.full(bus.model_shape, 114, np.uint8)  # Padding keeps YOLOv5's letterbox grey
+        self.display_buffer = None  # Only needed when the camera frame is not already display sized
+
+    def release(self):
+        self.bus.release(self)
+
+    def to_display(self, boxes):
+        """ Map (x1, y1, x2, y2, ...) rows from model input to display coordinates, in place. Returns boxes."""
+        left, top = self.bus.model_offset
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - left) / self.bus.model_scale
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - top) / self.bus.model_scale
+        return boxes
+
+
+class FrameBus(object):
+    """ Converts every new camera frame exactly once and shares the results between the display and the detector.
+        Frames used to be resized for the display, resized again for tracking, converted to RGB for the model and
+        letterboxed by it a third time. The bus thread instead resizes each frame straight to the model size and
+        swaps it to RGB in place, and hands the camera frame itself to the display when it already has the display
+        size. Consumers hold a reference while they use a frame, so its buffers are recycled only when every one
+        of them released it: nothing is allocated per frame once a few buffer sets exist.
+    """
+
+    def __init__(self, frame_read, display_size, model_size=640, stride=32):
+        self.source = FrameSource(frame_read)
+        self.display_size = display_size  # (width, height) of the frames consumers draw and steer on
+
+        # Letterbox geometry, the same AutoShape computes: longest side to model_size, padded to the model stride
+        self.model_scale = model_size / max(display_size)
+        width, height = round(display_size[0] * self.model_scale), round(display_size[1] * self.model_scale)
+        padded_width, padded_height = math.ceil(width / stride) * stride, math.ceil(height / stride) * stride
+        self.model_size = (width, height)
+        self.model_shape = (padded_height, padded_width, 3)
+        self.model_offset = ((padded_width - width) // 2, (padded_height - height) // 2)
+
+        self._cond = threading.Condition()
+        self._latest = None
+        self._free = []
+        self.running = False
+        self.thread = None
+
+        self.frames = 0
+        self.allocated = 0  # BusFrames (buffer sets) created, stays small if consumers release promptly
+
+    def start(self):
+        self.source.start()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.source.stop()
+        if self.thread is not None:
+            self.thread.join()
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, last_seq=0, timeout=None):
+        """ Wait for a frame newer than last_seq and take a reference to it. Returns the BusFrame or None on
+            timeout; the caller must release() it.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self.running or (self._latest is not None and self._latest.seq > last_seq),
+                                timeout)
+            frame = self._latest
+            if frame is None or frame.seq <= last_seq:
+                return None
+            frame.refs += 1
+            return frame
+
+    def release(self, frame):
+        with self._cond:
+            frame.refs -= 1
+            if frame.refs == 0:
+                frame.display = None  # Do not keep the camera frame alive
+                self._free.append(frame)
+
+    def run(self):
+        seq = 0
+        while self.running:
+            seq, raw, timestamp, captured = self.source.wait(seq, timeout=0.1)
+            if raw is None:
+                continue
+            frame = self.take()
+            self.convert(frame, raw)
+            frame.seq, frame.timestamp, frame.captured = seq, timestamp, captured
+            frame.converted = time.monotonic()
+            self.publish(frame)
+
+    def take(self):
+        with self._cond:
+            if self._free:
+                return self._free.pop()
+        self.allocated += 1
+        return BusFrame(self)
+
+    def convert(self, frame, raw):
+        # The frame reader hands out a new array for every frame and never writes to it again, so it can be shared
+        if (raw.shape[1], raw.shape[0]) == self.display_size:
+            frame.display = raw
+        else:
+            if frame.display_buffer is None:
+                frame.display_buffer = np.empty((self.display_size[1], self.display_size[0], 3), np.uint8)
+            frame.display = cv2.resize(raw, self.display_size, dst=frame.display_buffer)
+
+        # Resize first so only the small image is colour converted, both straight into the padded buffer
+        left, top = self.model_offset
+        width, height = self.model_size
+        content = frame.model_input[top:top + height, left:left + width]
+        cv2.resize(raw, self.model_size, dst=content, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(content, cv2.COLOR_BGR2RGB, dst=content)
+
+    def publish(self, frame):
+        with self._cond:
+            frame.refs += 1  # The bus' own reference, held until a newer frame replaces it
+            previous, self._latest = self._latest, frame
+            self.frames += 1
+            self._cond.notify_all()
+        if previous is not None:
+            self.release(previous)
+
+    def report(self):
+        return f"{self.frames} frames converted with {self.allocated} buffer sets"
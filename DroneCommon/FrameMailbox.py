@@ -0,0 +1,59 @@
+import threading
+
+
+class LatestFrameMailbox(object):
+    """ Single-slot mailbox that only ever holds the newest item.
+        Writers never block: a put replaces whatever has not been collected yet.
+        Readers block until an item newer than the one they last saw arrives.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._collected = 0
+        self._closed = False
+
+        # number of items overwritten before anyone collected them
+        self.dropped = 0
+
+    @property
+    def seq(self):
+        return self._seq
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, item):
+        """ Publish a new item and wake up waiting readers. Returns its sequence number."""
+        with self._cond:
+            if self._seq > self._collected:
+                self.dropped += 1
+            self._seq += 1
+            self._item = item
+            self._cond.notify_all()
+            return self._seq
+
+    def get(self, last_seq=0, timeout=None):
+        """ Wait for an item newer than last_seq.
+        Returns (seq, item), or (last_seq, None) on timeout or when the mailbox is closed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._seq > last_seq, timeout):
+                return last_seq, None
+            if self._seq <= last_seq:
+                return last_seq, None
+            self._collected = self._seq
+            return self._seq, self._item
+
+    def peek(self):
+        """ Return the current (seq, item) without waiting."""
+        with self._cond:
+            return self._seq, self._item
+
+    def close(self):
+        """ Release every waiting reader; later gets return immediately."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
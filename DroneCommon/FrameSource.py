@@ -0,0 +1,57 @@
+import threading
+import time
+
+from DroneCommon.FrameMailbox import LatestFrameMailbox
+
+
+class FrameSource(object):
+    """ Turns a djitellopy frame reader, which only ever offers "the current frame",
+        into a stream of genuinely new frames.
+        A watcher thread notices when the reader swaps in a new frame object and
+        publishes it with a sequence number; consumers block in wait() until a
+        frame newer than the one they have exists, instead of re-reading and
+        re-processing the same frame.
+    """
+
+    def __init__(self, frame_read, poll_interval=0.002):
+        self.frame_read = frame_read
+        self.poll_interval = poll_interval
+        self.mailbox = LatestFrameMailbox()
+        self.running = False
+        self.thread = None
+
+    @property
+    def seq(self):
+        return self.mailbox.seq
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.mailbox.close()
+
+    def wait(self, last_seq=0, timeout=None):
+        """ Block until a frame newer than last_seq exists.
+            Returns (seq, frame, capture time, monotonic capture time), frame and times are None on timeout.
+            The wall clock time goes to other machines, the monotonic one matches FrameTracer.
+        """
+        seq, item = self.mailbox.get(last_seq, timeout)
+        if item is None:
+            return seq, None, None, None
+        timestamp, frame, captured = item
+        return seq, frame, timestamp, captured
+
+    def _watch(self):
+        last = None
+        while self.running:
+            frame = self.frame_read.frame
+            if frame is None or frame is last:
+                time.sleep(self.poll_interval)
+                continue
+            last = frame
+            self.mailbox.put((time.time(), frame, time.monotonic()))
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+STAGES = ('capture', 'preprocess', 'inference', 'decision', 'command')
+
+
+class FrameTracer(object):
+    """ Per-frame latency tracing with a fixed memory footprint.
+        begin() gives every frame a monotonic id and stamps its capture time,
+        stamp() records when a later stage finished for that frame. The last
+        `capacity` frames are kept in a ring buffer; percentiles are computed
+        from it on demand, and dump() writes it out as CSV and JSON.
+        Stamping is two array writes, cheap enough to stay in the hot loop.
+    """
+
+    def __init__(self, name, capacity=1024, stages=STAGES):
+        self.name = name
+        self.capacity = capacity
+        self.stages = stages
+        self.index = {stage: i for i, stage in enumerate(stages)}
+        self.ids = np.full(capacity, -1, np.int64)
+        self.stamps = np.full((capacity, len(stages)), np.nan)
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def begin(self, at=None):
+        """ Start tracing a new frame, stamped as captured now or at the
+            time.monotonic() value `at`. Returns its id.
+        """
+        now = time.monotonic() if at is None else at
+        with self.lock:
+            frame_id = self.next_id
+            self.next_id += 1
+        slot = frame_id % self.capacity
+        self.stamps[slot] = np.nan
+        self.stamps[slot, 0] = now
+        self.ids[slot] = frame_id
+        return frame_id
+
+    def stamp(self, frame_id, stage, at=None):
+        """ Record that stage is done for frame_id, now or at the time.monotonic() value `at`.
+            Only the first stamp of a stage counts.
+        """
+        if frame_id is None:
+            return
+        slot = frame_id % self.capacity
+        column = self.index[stage]
+        if self.ids[slot] == frame_id and np.isnan(self.stamps[slot, column]):
+            self.stamps[slot, column] = time.monotonic() if at is None else at
+
+    def wrap(self, frame_id, function):
+        """ Wrap a command function so that calling it stamps 'command' for frame_id."""
+        def send(*args, **kwargs):
+            self.stamp(frame_id, 'command')
+            return function(*args, **kwargs)
+        return send
+
+    def latencies(self):
+        """ Milliseconds from capture to every stage, one row per traced frame."""
+        used = self.ids >= 0
+        stamps = self.stamps[used]
+        return self.ids[used], (stamps - stamps[:, :1]) * 1000
+
+    def percentiles(self, q=(50, 95, 99)):
+        """ {stage: {p50: ms, ...}} over the frames in the ring buffer that reached the stage."""
+        _, latencies = self.latencies()
+        result = {}
+        for stage in self.stages[1:]:
+            column = latencies[:, self.index[stage]]
+            column = column[~np.isnan(column)]
+            if len(column):
+                result[stage] = {'p{}'.format(p): float(v) for p, v in zip(q, np.percentile(column, q))}
+                result[stage]['frames'] = int(len(column))
+        return result
+
+    def summary(self):
+        lines = ["{} latency since capture (ms):".format(self.name)]
+        for stage, values in self.percentiles().items():
+            lines.append("  {:<11} p50 {:7.1f}  p95 {:7.1f}  p99 {:7.1f}  ({} frames)".format(
+                stage, values['p50'], values['p95'], values['p99'], values['frames']))
+        return "\n".join(lines)
+
+    def dump(self, directory=os.path.join('runs', 'trace')):
+        """ Write <name>.csv with the raw ring buffer and <name>.json with the percentiles."""
+        os.makedirs(directory, exist_ok=True)
+        ids, latencies = self.latencies()
+        order = np.argsort(ids)
+        base = os.path.join(directory, self.name)
+        with open(base + '.csv', 'w') as f:
+            f.write(",".join(('frame_id',) + tuple(s + '_ms' for s in self.stages[1:])) + "\n")
+            for i in order:
+                f.write(",".join([str(ids[i])] + ['' if np.isnan(v) else '{:.3f}'.format(v) for v in latencies[i, 1:]]) + "\n")
+        with open(base + '.json', 'w') as f:
+            json.dump(self.percentiles(), f, indent=2)
+        return base
@@ -0,0 +1,74 @@
+import collections
+import struct
+import time
+
+from DroneCommon.RateMeter import RateMeter
+
+
+class FramedReader(object):
+    """ Reads length-prefixed messages from a stream socket without re-copying them.
+        Every message is received with recv_into straight into one reusable buffer that only grows when a
+        bigger message arrives, and is returned as a memoryview of that buffer.
+        The header is described by a struct format whose last field is the payload length.
+        The length comes from the peer, so it is checked against max_size (and by `check`, if given) before
+        any of the payload is read or the buffer grows.
+    """
+
+    def __init__(self, sock, header="!Q", initial_size=1 << 16, window=30, max_size=1 << 26, check=None):
+        self.sock = sock
+        self.header = struct.Struct(header)
+        self.max_size = max_size  # Largest payload accepted, bigger announcements raise ValueError
+        self.check = check  # Called with the header fields, raises to reject the message
+        self._header_buffer = bytearray(self.header.size)
+        self._buffer = bytearray(initial_size)
+
+        self.frames = RateMeter(window)
+        self._sizes = collections.deque(maxlen=window)  # (time, bytes) of recent messages
+        self.bytes_received = 0
+
+    def read(self):
+        """ Receive one message. Returns (header fields, payload memoryview), or None once the peer closed.
+            The payload view is only valid until the next call to read().
+        """
+        if not self._read_exact(memoryview(self._header_buffer)):
+            return None
+        fields = self.header.unpack(self._header_buffer)
+        if self.check is not None:
+            self.check(fields)
+        size = fields[-1]
+        if size > self.max_size:
+            raise ValueError(f"Peer announced a {size} byte message, more than the {self.max_size} allowed")
+        if size > len(self._buffer):
+            self._buffer = bytearray(max(size, 2 * len(self._buffer)))
+        payload = memoryview(self._buffer)[:size]
+        if not self._read_exact(payload):
+            return None
+
+        self.frames.tick()
+        self.bytes_received += self.header.size + size
+        self._sizes.append((time.monotonic(), self.header.size + size))
+        return fields, payload
+
+    def frame_rate(self):
+        return self.frames.rate()
+
+    def byte_rate(self):
+        """ Bytes per second over the current window (0 until two messages were seen)."""
+        if len(self._sizes) < 2:
+            return 0.0
+        elapsed = self._sizes[-1][0] - self._sizes[0][0]
+        if elapsed <= 0:
+            return 0.0
+        return sum(size for _, size in list(self._sizes)[1:]) / elapsed
+
+    def report(self):
+        return f"{self.frame_rate():.1f} fps, {self.byte_rate() / 1024:.0f} KiB/s"
+
+    def _read_exact(self, view):
+        received = 0
+        while received < len(view):
+            count = self.sock.recv_into(view[received:])
+            if count == 0:
+                return False  # Connection has been lost
+            received += count
+        return True
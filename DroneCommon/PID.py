@@ -0,0 +1,41 @@
+class PID(object):
+    """ PID controller for a control loop that ticks faster than its measurements arrive.
+        The integral runs on every tick, the derivative is only refreshed when a new
+        measurement comes in, so a held measurement does not produce derivative spikes.
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, limit=100, integral_limit=1.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.limit = limit
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.prev_error = None
+        self._since_measurement = 0.0
+
+    def update(self, error, dt, fresh=True):
+        """ Advance the controller by dt seconds.
+        Arguments:
+            error: current error (setpoint - measurement)
+            dt: seconds since the previous update
+            fresh: whether error comes from a new measurement
+        """
+        self.integral = clamp(self.integral + error * dt, -self.integral_limit, self.integral_limit)
+
+        self._since_measurement += dt
+        if fresh:
+            if self.prev_error is not None and self._since_measurement > 0:
+                self.derivative = (error - self.prev_error) / self._since_measurement
+            self.prev_error = error
+            self._since_measurement = 0.0
+
+        output = self.kp * error + self.ki * self.integral + self.kd * self.derivative
+        return clamp(output, -self.limit, self.limit)
+
+
+def clamp(n, smallest, largest): return max(smallest, min(n, largest))
@@ -0,0 +1,152 @@
+import asyncio
+import collections
+import json
+import struct
+import time
+
+from DroneCommon.FramedStream import FramedReader
+
+# Every message starts with a fixed little-endian header:
+# magic, protocol version, message type, sequence number, capture timestamp (time.time()), payload length
+HEADER = struct.Struct("<2sBBIdI")
+MAGIC = b'DR'
+VERSION = 1
+MAX_PAYLOAD = 16 * 1024 * 1024  # Far above a raw 960x720 frame; anything larger is garbage, not a message
+
+# message types
+VIDEO = 1  # JPEG frame
+KEY = 2  # key command, utf-8 text
+TELEMETRY = 3  # drone state, utf-8 JSON
+ACK = 4  # acknowledges the frame whose seq is in the header, no payload (replaces the "ack <seq>" text command)
+SUBSCRIBE = 5  # chooses how video is sent, utf-8 JSON, see pack_subscribe
+TILES = 6  # changed tiles of a frame, see TileCodec
+SHARED_MEMORY = 7  # server's answer to a local client, utf-8 JSON {"name": SharedFrameRing name}
+
+TYPE_NAMES = {VIDEO: 'video', KEY: 'key', TELEMETRY: 'telemetry', ACK: 'ack', SUBSCRIBE: 'subscribe',
+              TILES: 'tiles', SHARED_MEMORY: 'shared memory'}
+
+Message = collections.namedtuple('Message', ['type', 'seq', 'timestamp', 'payload'])
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def pack(message_type, payload=b'', seq=0, timestamp=None):
+    """ Build a complete message ready for sendall."""
+    if timestamp is None:
+        timestamp = time.time()
+    return HEADER.pack(MAGIC, VERSION, message_type, seq & 0xFFFFFFFF, timestamp, len(payload)) + payload
+
+
+def pack_telemetry(state, seq=0):
+    return pack(TELEMETRY, json.dumps(state).encode(), seq)
+
+
+def unpack_telemetry(payload):
+    return json.loads(str(payload, 'utf-8'))
+
+
+def pack_subscribe(udp_port=0, tiles=False, shared_memory=False):
+    """ udp_port: receive video as datagrams on this port (0 keeps TCP), tiles: use the tile codec,
+        shared_memory: ask for raw frames through shared memory, only granted when on the server's machine.
+    """
+    options = {'udp_port': udp_port, 'tiles': tiles, 'shared_memory': shared_memory}
+    return pack(SUBSCRIBE, json.dumps(options).encode())
+
+
+def unpack_subscribe(payload):
+    options = json.loads(str(payload, 'utf-8'))
+    return options.get('udp_port', 0), options.get('tiles', False), options.get('shared_memory', False)
+
+
+def parse(data):
+    """ Turn one complete message held in memory (e.g. reassembled from datagrams) into a Message."""
+    fields = HEADER.unpack_from(data)
+    check_header(fields)
+    if len(data) != HEADER.size + fields[-1]:
+        raise ProtocolError(f"Message is {len(data)} bytes, header announces {HEADER.size + fields[-1]}")
+    return make_message(fields, memoryview(data)[HEADER.size:])
+
+
+class MessageReader(object):
+    """ Reads protocol messages from a stream socket. Payloads are memoryviews, valid until the next read."""
+
+    def __init__(self, sock, initial_size=1 << 16):
+        self.stream = FramedReader(sock, HEADER.format, initial_size, max_size=MAX_PAYLOAD, check=check_header)
+
+    def read(self):
+        """ Returns the next Message, or None once the peer closed. Raises ProtocolError on foreign data."""
+        message = self.stream.read()
+        if message is None:
+            return None
+        fields, payload = message
+        return make_message(fields, payload)
+
+    def report(self):
+        return self.stream.report()
+
+
+def check_header(fields):
+    """ Reject a header before its payload is read: the length is only trusted once magic and version match."""
+    magic, version, _, _, _, length = fields
+    if magic != MAGIC:
+        raise ProtocolError(f"Bad magic {magic!r}, peer does not speak this protocol")
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}, expected {VERSION}")
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Message announces {length} bytes, more than the {MAX_PAYLOAD} allowed")
+
+
+def make_message(fields, payload):
+    check_header(fields)
+    _, _, message_type, seq, timestamp, _ = fields
+    return Message(message_type, seq, timestamp, payload)
+
+
+async def read_message(stream):
+    """ Read the next Message from an asyncio StreamReader, or None once the peer closed."""
+    try:
+        fields = HEADER.unpack(await stream.readexactly(HEADER.size))
+        check_header(fields)
+        payload = await stream.readexactly(fields[-1])
+    except asyncio.IncompleteReadError:
+        return None
+    return make_message(fields, payload)
+
+
+class LatencyMonitor(object):
+    """ One-way latency of timestamped messages.
+        The two machines' clocks are not synchronised, so a frame counts as stale by how much later it arrives
+        than the fastest frame of the last few seconds, which cancels any constant clock offset. Arrival times
+        come from the local monotonic clock; the best case is a sliding minimum, so a lasting change of the link
+        or a step of the sender's clock is adopted after one window instead of freezing the video for good.
+    """
+
+    def __init__(self, max_delay=0.3, window=5.0):
+        self.max_delay = max_delay  # Frames arriving this much later than the best case are dropped
+        self.window = window  # Seconds a best case is remembered
+        self.samples = collections.deque()  # (arrival, offset), offsets increasing: the window minimum is first
+        self.best = None
+        self.latency = 0.0  # Delay of the latest message above the best case, in seconds
+        self.last_fresh = None
+        self.stale = 0
+
+    def observe(self, timestamp):
+        """ Record a message's capture timestamp. Returns True if it is still fresh enough to use."""
+        now = time.monotonic()
+        offset = now - timestamp
+        while self.samples and self.samples[-1][1] >= offset:
+            self.samples.pop()
+        self.samples.append((now, offset))
+        while now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+        self.best = self.samples[0][1]
+        self.latency = offset - self.best
+
+        # Never go longer than max_delay without showing anything, however late the frames are
+        if self.latency > self.max_delay and self.last_fresh is not None and now - self.last_fresh < self.max_delay:
+            self.stale += 1
+            return False
+        self.last_fresh = now
+        return True
@@ -0,0 +1,23 @@
+import collections
+import time
+
+
+class RateMeter(object):
+    """ Measures how often an event happens over a sliding window of recent ticks."""
+
+    def __init__(self, window=30):
+        self._stamps = collections.deque(maxlen=window)
+        self.count = 0
+
+    def tick(self):
+        self._stamps.append(time.monotonic())
+        self.count += 1
+
+    def rate(self):
+        """ Events per second over the current window (0 until two ticks were seen)."""
+        if len(self._stamps) < 2:
+            return 0.0
+        elapsed = self._stamps[-1] - self._stamps[0]
+        if elapsed <= 0:
+            return 0.0
+        return (len(self._stamps) - 1) / elapsed
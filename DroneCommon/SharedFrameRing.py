@@ -0,0 +1,115 @@
+import struct
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Ring header: magic, version, number of slots, frame height, width, channels, latest written seq
+RING_HEADER = struct.Struct("<4sIIIIIQ")
+MAGIC = b'DRNG'
+VERSION = 1
+# Slot header: seqlock counter (odd while the slot is being written), frame seq, capture timestamp
+SLOT_HEADER = struct.Struct("<QQd")
+ALIGN = 64
+
+
+class SharedFrameRing(object):
+    """ Ring of raw BGR frames in shared memory, for viewers running on the same machine as the server.
+        One process writes, any number of processes read without locks: every slot has a seqlock counter that
+        is odd while the writer fills it, so a reader checks the counter before and after using a slot and
+        simply discards the frame if the writer touched it in between. Readers get numpy views straight into
+        shared memory, nothing is encoded or copied on the way.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        magic, version, self.slots, height, width, channels, _ = RING_HEADER.unpack_from(shm.buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Shared memory {shm.name} does not hold a frame ring")
+        self.shape = (height, width, channels)
+        self.frame_size = height * width * channels
+        self.slot_size = -(-(SLOT_HEADER.size + self.frame_size) // ALIGN) * ALIGN
+        self.header_size = -(-RING_HEADER.size // ALIGN) * ALIGN
+        self.seq = 0
+
+        # 64 bit views of the counters so the writer updates them with a single store
+        self._write_seq = np.ndarray((1,), np.uint64, shm.buf, RING_HEADER.size - 8)
+        self._counters = [np.ndarray((1,), np.uint64, shm.buf, self.slot_offset(slot)) for slot in range(self.slots)]
+        self._frames = [np.ndarray(self.shape, np.uint8, shm.buf, self.slot_offset(slot) + SLOT_HEADER.size)
+                        for slot in range(self.slots)]
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, shape, slots=4):
+        """ Allocate a new ring for frames of the given (height, width, channels) shape."""
+        height, width, channels = shape
+        header_size = -(-RING_HEADER.size // ALIGN) * ALIGN
+        slot_size = -(-(SLOT_HEADER.size + height * width * channels) // ALIGN) * ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=header_size + slots * slot_size)
+        RING_HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, slots, height, width, channels, 0)
+        for slot in range(slots):
+            SLOT_HEADER.pack_into(shm.buf, header_size + slot * slot_size, 0, 0, 0.0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """ Open a ring created by another process."""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            # Older versions register the segment for removal when this process exits, the server owns it
+            shm = shared_memory.SharedMemory(name=name)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+
+    def slot_offset(self, slot):
+        return self.header_size + slot * self.slot_size
+
+    def write(self, frame, timestamp=None):
+        """ Writer side: copy a frame into the next slot and publish it. Returns its seq."""
+        if timestamp is None:
+            timestamp = time.time()
+        self.seq += 1
+        slot = self.seq % self.slots
+        counter = self._counters[slot]
+        counter[0] += 1  # Odd: readers keep away
+        self._frames[slot][...] = frame
+        struct.pack_into("<Qd", self.shm.buf, self.slot_offset(slot) + 8, self.seq, timestamp)
+        counter[0] += 1  # Even again: slot is consistent
+        self._write_seq[0] = self.seq
+        return self.seq
+
+    def read(self, last_seq=0):
+        """ Reader side: newest frame if it is newer than last_seq.
+            Returns (seq, timestamp, frame view, token) or None. The view points into shared memory, check
+            valid(token) after using it; False means the writer reused the slot meanwhile and the result is torn.
+        """
+        seq = int(self._write_seq[0])
+        if seq <= last_seq:
+            return None
+        slot = seq % self.slots
+        before = int(self._counters[slot][0])
+        if before & 1:
+            return None  # Being rewritten, the next call will see a newer frame
+        frame_seq, timestamp = struct.unpack_from("<Qd", self.shm.buf, self.slot_offset(slot) + 8)
+        if frame_seq != seq:
+            return None
+        return seq, timestamp, self._frames[slot], (slot, before)
+
+    def valid(self, token):
+        slot, before = token
+        return int(self._counters[slot][0]) == before
+
+    def close(self):
+        # Views must go before the buffer can be released
+        self._write_seq = None
+        self._counters = []
+        self._frames = []
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+
+AXES = ('left_right', 'forward_back', 'up_down', 'yaw')
+
+
+def shape_axis(value, deadband=0.1, expo=0.4):
+    """ Stick value in [-1, 1] -> shaped value in [-1, 1].
+        Values inside the deadband are zero, the rest is rescaled so the output still starts at 0, then
+        bent with an expo curve: fine control around the centre, full speed at the end of the travel.
+    """
+    value = max(-1.0, min(1.0, value))
+    if abs(value) <= deadband:
+        return 0.0
+    sign = 1.0 if value > 0 else -1.0
+    value = (abs(value) - deadband) / (1.0 - deadband)
+    return sign * ((1.0 - expo) * value + expo * value ** 3)
+
+
+class RcController(object):
+    """ Sends one rc velocity command per tick from a dedicated thread.
+        The UI only stores the current stick/key state with set_axis(), which never blocks or touches the
+        network. Every tick the thread shapes the axes, limits how fast each velocity may change, and sends
+        a single 'rc' command, so a held stick means a steady command stream at a known rate instead of a
+        flood of move commands. Discrete commands (takeoff, land, flips) are queued with request() and run
+        on the same thread between ticks.
+    """
+
+    def __init__(self, send_rc, rate=20, max_speed=60, deadband=0.1, expo=0.4, max_accel=150):
+        self.send_rc = send_rc  # Called with four ints in [-100, 100]: left/right, forward/back, up/down, yaw
+        self.rate = rate  # Commands per second
+        self.max_speed = max_speed  # Velocity at full stick, per axis if a dict is given
+        self.deadband = deadband
+        self.expo = expo
+        self.max_step = max_accel / float(rate)  # Largest velocity change per tick
+
+        self.axes = dict.fromkeys(AXES, 0.0)
+        self.output = dict.fromkeys(AXES, 0.0)
+        self.requests = queue.Queue()
+        self.running = False
+        self.thread = None
+        self.sent = 0
+        self.failed = 0  # Commands or rc sends that raised, the thread carries on regardless
+        self.late_ticks = 0
+
+    def set_axis(self, axis, value):
+        self.axes[axis] = value  # A single store, safe to call from the event loop
+
+    def request(self, function, *args):
+        """ Run a blocking drone command on the control thread."""
+        self.requests.put((function, args))
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def speed(self, axis):
+        if isinstance(self.max_speed, dict):
+            return self.max_speed[axis]
+        return self.max_speed
+
+    def tick(self):
+        """ Compute the next command from the current axes. Returns the four velocities."""
+        command = []
+        for axis in AXES:
+            target = shape_axis(self.axes[axis], self.deadband, self.expo) * self.speed(axis)
+            current = self.output[axis]
+            current += max(-self.max_step, min(self.max_step, target - current))
+            self.output[axis] = current
+            command.append(int(round(current)))
+        return command
+
+    def run(self):
+        period = 1.0 / self.rate
+        next_tick = time.monotonic()
+        while self.running:
+            while not self.requests.empty():
+                function, args = self.requests.get()
+                try:
+                    function(*args)
+                except Exception as e:
+                    # Losing the thread would lose rc control while the drone may be in the air
+                    self.failed += 1
+                    print("Command {} failed: {}".format(getattr(function, '__name__', function), e))
+                next_tick = time.monotonic()  # Blocking commands shift the schedule instead of bursting after
+                self.output = dict.fromkeys(AXES, 0.0)
+
+            try:
+                self.send_rc(*self.tick())
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                print("rc command failed: {}".format(e))
+
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.late_ticks += 1
+                next_tick = time.monotonic()
+
+        self.send_rc(0, 0, 0, 0)  # Leave the drone hovering
@@ -0,0 +1,131 @@
+import collections
+import math
+import socket
+import threading
+import time
+
+import numpy as np
+
+# Tello state fields that are kept, in record order after the timestamp
+FIELDS = ('bat', 'h', 'pitch', 'roll', 'yaw', 'vgx', 'vgy', 'vgz', 'templ', 'temph', 'tof', 'baro', 'time')
+# battery %, height cm, attitude degrees, speeds dm/s, temperatures C, time of flight sensor cm, barometer m,
+# motor on time s
+TelemetryRecord = collections.namedtuple('TelemetryRecord', (
+    'timestamp', 'battery', 'height', 'pitch', 'roll', 'yaw', 'speed_x', 'speed_y', 'speed_z',
+    'temp_low', 'temp_high', 'tof', 'baro', 'flight_time'))
+FIELD_INDEX = {field: index for index, field in enumerate(FIELDS)}
+
+
+def parse_state(data, timestamp=None):
+    """ One state datagram ("pitch:0;roll:0;...;\\r\\n") -> TelemetryRecord. Missing fields are NaN."""
+    values = [math.nan] * len(FIELDS)
+    for item in data.decode('ascii', 'replace').split(';'):
+        key, _, value = item.partition(':')
+        index = FIELD_INDEX.get(key.strip())
+        if index is not None:
+            try:
+                values[index] = float(value)
+            except ValueError:
+                pass
+    return TelemetryRecord(time.time() if timestamp is None else timestamp, *values)
+
+
+class TelemetryCache(object):
+    """ Newest drone state plus a ring buffer of the recent ones.
+        One thread writes with update(), readers never take a lock: `latest` is replaced by a single reference
+        store, and history() copies rows out of the ring and drops any the writer reused while it was copying.
+    """
+
+    def __init__(self, history=600):
+        self.capacity = history  # Records kept, 60 s of the drone's 10 Hz state stream
+        self.buffer = np.full((history, len(TelemetryRecord._fields)), np.nan)
+        self.count = 0
+        self.latest = None
+        self.updated = threading.Event()  # Set once the first record arrived
+
+    def update(self, record):
+        self.buffer[self.count % self.capacity] = record
+        self.count += 1  # Publish the row only after it is complete
+        self.latest = record
+        self.updated.set()
+
+    def wait(self, timeout=None):
+        """ Latest record, waiting up to timeout for the first one. None if nothing arrived."""
+        self.updated.wait(timeout)
+        return self.latest
+
+    def age(self):
+        """ Seconds since the latest record, infinite before the first one."""
+        latest = self.latest
+        return math.inf if latest is None else time.time() - latest.timestamp
+
+    def history(self, count=None):
+        """ Up to count most recent records as rows in TelemetryRecord order, oldest first."""
+        end = self.count
+        count = min(end, self.capacity) if count is None else min(count, end, self.capacity)
+        rows = self.buffer[np.arange(end - count, end) % self.capacity]
+        # Rows the writer reached while we copied (plus the one it may be writing) are not trustworthy
+        reused = self.count - end + 1 + count - self.capacity
+        return rows[max(reused, 0):]
+
+    def series(self, name, count=None):
+        """ History of a single field, e.g. series('height')."""
+        return self.history(count)[:, TelemetryRecord._fields.index(name)]
+
+
+class TelemetryListener(object):
+    """ Receives the Tello state stream on its own thread and keeps it in a TelemetryCache.
+        The drone sends its state to port 8890 about ten times per second once it got the "command" command,
+        so reading battery or height from the cache is free instead of a blocking query round trip.
+        djitellopy already listens on this port and caches the state itself; this is for easytello scripts.
+    """
+
+    STATE_PORT = 8890
+
+    def __init__(self, cache=None, host='', port=STATE_PORT):
+        self.cache = cache if cache is not None else TelemetryCache()
+        self.address = (host, port)
+        self.sock = None
+        self.thread = None
+        self.running = False
+        self.received = 0
+
+    @property
+    def latest(self):
+        return self.cache.latest
+
+    def start(self):
+        """ Bind the state port. Call before the drone is told to enter SDK mode so no state is missed."""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        self.sock.settimeout(0.2)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def run(self):
+        while self.running:
+            try:
+                data, _ = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.cache.update(parse_state(data))
+            self.received += 1
+
+    def summary(self):
+        """ Short status line for window titles and huds."""
+        state = self.cache.latest
+        if state is None:
+            return "No telemetry"
+        return f"Battery {state.battery:.0f}%  Height {state.height:.0f} cm  ToF {state.tof:.0f} cm"
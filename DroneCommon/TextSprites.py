@@ -0,0 +1,100 @@
+import collections
+
+import cv2
+import numpy as np
+
+
+class TextSprite(object):
+    """ One rasterised string: where it sits relative to the text origin and how to paint it."""
+
+    def __init__(self, mask, dx, dy, color):
+        self.dx, self.dy = dx, dy  # Offset of the sprite's top left corner from the putText origin
+        self.shape = mask.shape
+        self.solid = np.isin(mask, (0, 255)).all()  # Aliased text is painted, anti-aliased text is blended
+        if self.solid:
+            # Clear the text pixels, then set them to the colour: two in-place bitwise operations
+            painted = np.repeat(mask[..., None], len(color), axis=2)
+            self.keep = np.bitwise_not(painted)
+            self.paint = painted & np.array(color, np.uint8)
+        else:
+            # Integer blend with coverage scaled to 0..256: (pixel * (256 - a) + colour * a + 128) >> 8
+            # is exact for empty and fully covered pixels and fits in 16 bits
+            alpha = ((mask.astype(np.uint16) * 256 + 127) // 255)[..., None]
+            self.inverse = np.repeat(256 - alpha, len(color), axis=2)
+            self.premultiplied = alpha * np.array(color, np.uint16) + 128
+
+
+class TextSpriteCache(object):
+    """ Draws text like cv2.putText, but rasterises every distinct string only once.
+        Hud lines and box labels mostly repeat from frame to frame, so instead of running the Hershey font
+        renderer each time, put() looks the text up in a bounded LRU of sprites keyed by string, font, scale,
+        colour, thickness and line type, and copies the cached pixels onto the frame. Only new strings are drawn.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity  # Sprites kept, the least recently used one goes first
+        self.sprites = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, frame, text, org, font=cv2.FONT_HERSHEY_SIMPLEX, scale=1.0, color=(255, 255, 255), thickness=1,
+            line_type=cv2.LINE_8):
+        """ Same arguments and placement as cv2.putText (bottom left of the text at org). Returns frame."""
+        sprite = self.sprite(text, font, scale, tuple(color), thickness, line_type)
+        height, width = sprite.shape
+        x, y = int(org[0]) + sprite.dx, int(org[1]) + sprite.dy
+
+        if x >= 0 and y >= 0 and x + width <= frame.shape[1] and y + height <= frame.shape[0]:
+            self.draw(frame[y:y + height, x:x + width], sprite, Ellipsis)
+            return frame
+
+        # Clip to the frame, labels of boxes at the border are partly outside
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, frame.shape[1]), min(y + height, frame.shape[0])
+        if x0 < x1 and y0 < y1:
+            self.draw(frame[y0:y1, x0:x1], sprite, (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)))
+        return frame
+
+    @staticmethod
+    def draw(roi, sprite, part):
+        if sprite.solid:
+            np.bitwise_and(roi, sprite.keep[part], out=roi)
+            np.bitwise_or(roi, sprite.paint[part], out=roi)
+        else:
+            blended = roi * sprite.inverse[part]
+            blended += sprite.premultiplied[part]
+            blended >>= 8
+            np.copyto(roi, blended, casting='unsafe')
+
+    def sprite(self, text, font, scale, color, thickness, line_type):
+        key = (text, font, scale, color, thickness, line_type)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        sprite = self.rasterise(text, font, scale, color, thickness, line_type)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.capacity:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def rasterise(self, text, font, scale, color, thickness, line_type):
+        (width, height), baseline = cv2.getTextSize(text, font, scale, thickness)
+        # Strokes reach past the nominal text box by about the line thickness, leave room on every side
+        pad = thickness + 2
+        mask = np.zeros((height + baseline + 2 * pad, width + 2 * pad), np.uint8)
+        cv2.putText(mask, text, (pad, pad + height), font, scale, 255, thickness, line_type)
+
+        # Keep only the painted part
+        ys, xs = np.nonzero(mask)
+        if len(ys) == 0:
+            return TextSprite(np.zeros((1, 1), np.uint8), 0, 0, color)
+        top, left = ys.min(), xs.min()
+        mask = mask[top:ys.max() + 1, left:xs.max() + 1]
+        return TextSprite(mask, int(left) - pad, int(top) - pad - height, color)
+
+    def report(self):
+        return f"{len(self.sprites)} text sprites cached, {self.hits} hits, {self.misses} misses"
@@ -0,0 +1,162 @@
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from DroneCommon import Protocol
+
+# A TILES message payload: frame width, frame height, tile size, number of tiles,
+# then for every tile: column, row, JPEG length and the JPEG bytes
+TILE_HEADER = struct.Struct("<HHHH")
+TILE_ENTRY = struct.Struct("<HHI")
+
+
+class TileEncoder(object):
+    """ Server side of the tile codec, one per client.
+        The frame is split into square tiles and only the tiles that differ from what the client already shows
+        are JPEG encoded and sent; a full frame goes out as a normal VIDEO keyframe periodically, when the size
+        changes or when so much changed that tiles would not pay off.
+        The reference (what the client's canvas holds) only moves when a message is actually sent, so a message
+        dropped from the client's mailbox can never leave the two out of step.
+    """
+
+    def __init__(self, tile_size=80, threshold=6.0, keyframe_interval=2.0, max_changed=0.5):
+        self.tile_size = tile_size
+        self.threshold = threshold  # Mean absolute difference (0-255) above which a tile counts as changed
+        self.keyframe_interval = keyframe_interval  # Seconds between full frames, bounds JPEG drift and losses
+        self.max_changed = max_changed  # Fraction of changed tiles above which a keyframe is cheaper
+
+        self.lock = threading.Lock()
+        self.reference = None
+        self.version = 0
+        self.last_keyframe = 0.0
+
+        self.keyframes = 0
+        self.deltas = 0
+        self.tiles_sent = 0
+        self.tiles_total = 0
+
+    def encode(self, seq, frame, timestamp, quality):
+        """ Returns (message, commit) or None when nothing changed. Call commit() right before sending the
+            message; it returns False if the message was built on an outdated reference and must not be sent.
+        """
+        with self.lock:
+            reference, version = self.reference, self.version
+            keyframe_due = time.monotonic() - self.last_keyframe >= self.keyframe_interval
+        if reference is None or reference.shape != frame.shape or keyframe_due:
+            return self.encode_keyframe(seq, frame, timestamp, quality, version)
+
+        rows, cols, changed = self.changed_tiles(frame, reference)
+        if len(changed) == 0:
+            return None
+        if len(changed) > self.max_changed * rows * cols:
+            return self.encode_keyframe(seq, frame, timestamp, quality, version)
+
+        size = self.tile_size
+        height, width = frame.shape[:2]
+        updated = reference.copy()
+        parts = [TILE_HEADER.pack(width, height, size, len(changed))]
+        for row, col in changed:
+            y, x = row * size, col * size
+            tile = frame[y:y + size, x:x + size]
+            _, buffer = cv2.imencode('.jpg', tile, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            parts.append(TILE_ENTRY.pack(col, row, len(buffer)))
+            parts.append(buffer.tobytes())
+            updated[y:y + size, x:x + size] = tile
+        message = Protocol.pack(Protocol.TILES, b''.join(parts), seq, timestamp)
+
+        def commit():
+            if not self.advance(version, updated, False):
+                return False
+            self.deltas += 1
+            self.tiles_sent += len(changed)
+            self.tiles_total += rows * cols
+            return True
+        return message, commit
+
+    def encode_keyframe(self, seq, frame, timestamp, quality, version):
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        message = Protocol.pack(Protocol.VIDEO, buffer.tobytes(), seq, timestamp)
+
+        def commit():
+            if not self.advance(version, frame, True):
+                return False
+            self.keyframes += 1
+            return True
+        return message, commit
+
+    def changed_tiles(self, frame, reference):
+        """ Vectorised per-tile mean absolute difference. Returns (rows, cols, array of (row, col))."""
+        size = self.tile_size
+        height, width = frame.shape[:2]
+        rows, cols = -(-height // size), -(-width // size)
+        diff = cv2.absdiff(frame, reference)
+        if rows * size != height or cols * size != width:
+            diff = cv2.copyMakeBorder(diff, 0, rows * size - height, 0, cols * size - width, cv2.BORDER_CONSTANT)
+        means = diff.reshape(rows, size, cols, size, -1).mean(axis=(1, 3, 4))
+        return rows, cols, np.argwhere(means > self.threshold)
+
+    def advance(self, version, reference, keyframe):
+        with self.lock:
+            if version != self.version:
+                return False  # Another message went out since this one was encoded
+            self.reference = reference
+            self.version += 1
+            if keyframe:
+                self.last_keyframe = time.monotonic()
+            return True
+
+    def report(self):
+        ratio = self.tiles_sent / self.tiles_total if self.tiles_total else 0.0
+        return f"{self.keyframes} keyframes, {self.deltas} tile updates ({ratio:.0%} of tiles)"
+
+
+class TileCanvas(object):
+    """ Client side of the tile codec.
+        Unlike whole frames, tile updates must all be applied in order, so instead of keeping only the newest
+        message the network thread queues them here; a keyframe makes everything queued before it obsolete.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.canvas = None
+
+        self.dropped = 0  # frames replaced by a newer keyframe before they were decoded
+        self.skipped = 0  # tile updates that arrived without a keyframe to apply them to
+
+    def push(self, message_type, payload):
+        with self.lock:
+            if message_type == Protocol.VIDEO:
+                self.dropped += len(self.pending)
+                self.pending = [(message_type, payload)]
+            else:
+                self.pending.append((message_type, payload))
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+    def apply(self, messages):
+        """ Apply queued messages in order. Returns the BGR canvas, or None if there is nothing to show yet."""
+        for message_type, payload in messages:
+            if message_type == Protocol.VIDEO:
+                self.canvas = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+                continue
+
+            width, height, size, count = TILE_HEADER.unpack_from(payload)
+            if self.canvas is None or self.canvas.shape[:2] != (height, width):
+                self.skipped += 1
+                continue
+            offset = TILE_HEADER.size
+            for _ in range(count):
+                col, row, length = TILE_ENTRY.unpack_from(payload, offset)
+                offset += TILE_ENTRY.size
+                tile = cv2.imdecode(np.frombuffer(payload, np.uint8, length, offset), cv2.IMREAD_COLOR)
+                offset += length
+                y, x = row * size, col * size
+                self.canvas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+        return self.canvas
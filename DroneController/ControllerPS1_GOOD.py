@@ -1,16 +1,32 @@
 import pygame
 import cv2
 import time
+import sys
+from pathlib import Path
 from easytello import tello
 
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon.StickControl import RcController
+from DroneCommon.Telemetry import TelemetryListener
+
 
 # Initialize Pygame and Joystick
 pygame.init()
 pygame.display.set_mode((400, 300))
 
+# Drone state streams in on its own thread, reading it never waits on a query round trip.
+# Listen before connecting so the first state datagrams are not missed
+telemetry = TelemetryListener()
+telemetry.start()
+
 # Initialize Tello SDK
 drone = tello.Tello()
-print("Battery:", drone.get_battery())
+state = telemetry.cache.wait(timeout=2.0)
+print("Battery:", f"{state.battery:.0f}%" if state else "unknown (no telemetry)")
 
 # Start video stream
 drone.streamon()
@@ -32,6 +48,46 @@ else:
     print("No joystick found. Please connect a joystick.")
     exit()
 
+def send_rc(left_right, forward_back, up_down, yaw):
+    # easytello's rc_control waits for a reply the drone never sends to rc, so write the datagram directly
+    drone.socket.sendto(f'rc {left_right} {forward_back} {up_down} {yaw}'.encode('utf-8'), drone.tello_address)
+
+# Continuous control: input only updates analog axes, a fixed-rate thread sends one rc command per tick
+# and runs takeoff/land/flips, so the event loop never waits on the network. False keeps the discrete moves.
+CONTINUOUS_CONTROL = True
+rc = RcController(send_rc, rate=20, max_speed={'left_right': 50, 'forward_back': 50, 'up_down': 40, 'yaw': 60},
+                  deadband=0.1, expo=0.4, max_accel=150)
+
+# Buttons that are held to move, as (axis, direction)
+button_axis_map = {
+    0: ('up_down', 1),  # Triangle for up
+    2: ('up_down', -1),  # X for down
+    6: ('yaw', 1),  # L trigger for cw
+    7: ('yaw', -1),  # R trigger for ccw
+}
+
+button_request_map = {
+    3: drone.takeoff,  # Square for takeoff
+    1: drone.land,  # Circle for land
+    4: lambda: drone.flip('f'),
+    5: lambda: drone.flip('b'),
+}
+
+def handle_joystick_state(event):
+    """Store the stick and button state as analog axes, the rc thread does the rest."""
+    if event.type == pygame.JOYBUTTONDOWN and event.button in button_request_map:
+        rc.request(button_request_map[event.button])
+    elif event.type == pygame.JOYAXISMOTION:
+        if event.axis == 0:  # X axis
+            rc.set_axis('left_right', event.value)
+        elif event.axis == 1:  # Y axis, pushing forward gives negative values
+            rc.set_axis('forward_back', -event.value)
+    elif event.type in [pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP]:
+        for axis in ('up_down', 'yaw'):
+            value = sum(direction for button, (button_axis, direction) in button_axis_map.items()
+                        if button_axis == axis and joystick.get_button(button))
+            rc.set_axis(axis, value)
+
 def handle_joystick_input(event):
     if event.type == pygame.JOYBUTTONDOWN:
         if event.button == 3:  # Square for takeoff
@@ -64,17 +120,32 @@ def handle_joystick_input(event):
                 execute_command(lambda: drone.back(SPEED))
 
 def main():
+    if CONTINUOUS_CONTROL:
+        rc.start()
     running = True
+    caption = None
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif CONTINUOUS_CONTROL and event.type in [pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP]:
+                handle_joystick_state(event)
             elif event.type in [pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN]:
                 handle_joystick_input(event)
 
         cv2.waitKey(1)
 
+        # Show the latest state in the window title, only touching the window when it changed
+        summary = telemetry.summary()
+        if summary != caption:
+            caption = summary
+            pygame.display.set_caption(caption)
+
     # Clean up on exit
+    if CONTINUOUS_CONTROL:
+        rc.stop()
+        print(f"Sent {rc.sent} rc commands, {rc.late_ticks} late ticks")
+    telemetry.stop()
     drone.streamoff()
     cv2.destroyAllWindows()
 
@@ -1,15 +1,31 @@
 import pygame
 import cv2
 import time
+import sys
+from pathlib import Path
 from easytello import tello
 
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon.StickControl import AXES, RcController
+from DroneCommon.Telemetry import TelemetryListener
+
 # Initialize Pygame
 pygame.init()
 pygame.display.set_mode((400, 300))
 
+# Drone state streams in on its own thread, reading it never waits on a query round trip.
+# Listen before connecting so the first state datagrams are not missed
+telemetry = TelemetryListener()
+telemetry.start()
+
 # Initialize Tello SDK
 drone = tello.Tello()
-print("Battery:", drone.get_battery())
+state = telemetry.cache.wait(timeout=2.0)
+print("Battery:", f"{state.battery:.0f}%" if state else "unknown (no telemetry)")
 
 # Start video stream
 drone.streamon()
@@ -38,13 +54,59 @@ key_action_map = {
     pygame.K_p: lambda : execute_command(lambda: drone.flip('f')),
 }
 
+def send_rc(left_right, forward_back, up_down, yaw):
+    # easytello's rc_control waits for a reply the drone never sends to rc, so write the datagram directly
+    drone.socket.sendto(f'rc {left_right} {forward_back} {up_down} {yaw}'.encode('utf-8'), drone.tello_address)
+
+# Continuous control: input only updates analog axes, a fixed-rate thread sends one rc command per tick
+# and runs takeoff/land/flips, so the event loop never waits on the network. False keeps the discrete moves.
+CONTINUOUS_CONTROL = True
+rc = RcController(send_rc, rate=20, max_speed={'left_right': 50, 'forward_back': 50, 'up_down': 40, 'yaw': 60},
+                  deadband=0.1, expo=0.4, max_accel=150)
+
+# Held keys drive the axes at full deflection, the rate limit turns that into a smooth ramp
+key_axis_map = {
+    pygame.K_w: ('forward_back', 1),
+    pygame.K_s: ('forward_back', -1),
+    pygame.K_d: ('left_right', 1),
+    pygame.K_a: ('left_right', -1),
+    pygame.K_UP: ('up_down', 1),
+    pygame.K_DOWN: ('up_down', -1),
+    pygame.K_RIGHT: ('yaw', 1),
+    pygame.K_LEFT: ('yaw', -1),
+}
+
+key_request_map = {
+    pygame.K_SPACE: drone.takeoff,
+    pygame.K_ESCAPE: drone.land,
+    pygame.K_o: lambda: drone.flip('b'),
+    pygame.K_p: lambda: drone.flip('f'),
+}
+
+def update_key_axes():
+    """Recompute every axis from the keys currently held."""
+    pressed = pygame.key.get_pressed()
+    values = dict.fromkeys(AXES, 0.0)
+    for key, (axis, direction) in key_axis_map.items():
+        if pressed[key]:
+            values[axis] += direction
+    for axis, value in values.items():
+        rc.set_axis(axis, value)
+
 def main():
+    if CONTINUOUS_CONTROL:
+        rc.start()
     running = True
+    caption = None
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            if event.type == pygame.KEYDOWN:
+            if CONTINUOUS_CONTROL and event.type in [pygame.KEYDOWN, pygame.KEYUP]:
+                if event.type == pygame.KEYDOWN and event.key in key_request_map:
+                    rc.request(key_request_map[event.key])
+                update_key_axes()
+            elif event.type == pygame.KEYDOWN:
                 action = key_action_map.get(event.key)
                 if action:
                     action()  # Execute the mapped function
@@ -52,7 +114,17 @@ def main():
         # Display the video frame by continuously updating it within the while loop
         cv2.waitKey(1)
 
+        # Show the latest state in the window title, only touching the window when it changed
+        summary = telemetry.summary()
+        if summary != caption:
+            caption = summary
+            pygame.display.set_caption(caption)
+
     # Clean up on exit
+    if CONTINUOUS_CONTROL:
+        rc.stop()
+        print(f"Sent {rc.sent} rc commands, {rc.late_ticks} late ticks")
+    telemetry.stop()
     drone.streamoff()
     cv2.destroyAllWindows()
 
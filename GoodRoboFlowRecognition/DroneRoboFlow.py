@@ -3,24 +3,49 @@ import numpy as np
 import torch
 from djitellopy import Tello
 from threading import Thread
+import sys
 import time
+from pathlib import Path
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon.FrameTrace import FrameTracer
+from ModelRegistry import ModelRegistry
 
 def preprocess_frame(frame):
     """Convert frame to grayscale and normalize."""
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     return cv2.equalizeHist(gray)
 
-def detect_objects(tello, model_manager):
+def detect_objects(tello, registry):
     global stop_thread
+    tracer = FrameTracer('roboflow')
     while not stop_thread:
         frame = tello.get_frame_read().frame
         if frame is None or np.array(frame).size == 0:
             continue
+        frame_id = tracer.begin()
+
+        # Take the active model once, a switch only takes effect on the next frame
+        model, model_label = registry.current()
+        if model is None:
+            cv2.putText(frame, "Loading model...", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            cv2.imshow('Tello Detection', frame)
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('0'):
+                break
+            handle_key_press(key, tello, registry)
+            continue
 
         resized_frame = cv2.resize(frame, (640, 480))
         processed_frame = preprocess_frame(resized_frame)
-        results = model_manager['model'](processed_frame)
+        tracer.stamp(frame_id, 'preprocess')
+        results = model(processed_frame)
         predictions = results.pandas().xyxy[0]
+        tracer.stamp(frame_id, 'inference')
 
         original_height, original_width = frame.shape[:2]
         scale_x = original_width / 640
@@ -35,18 +60,24 @@ def detect_objects(tello, model_manager):
             label = f"{row['name']} {row['confidence']:.2f}"
             cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
 
-        cv2.putText(frame, f"Current Model: {model_manager['label']}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        status = f"Current Model: {model_label}"
+        pending = registry.pending_label()
+        if pending:
+            status += f" (loading {pending})"
+        cv2.putText(frame, status, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
         cv2.imshow('Tello Detection', frame)
 
         key = cv2.waitKey(1) & 0xFF
         if key == ord('0'):
             break
-        handle_key_press(key, tello, model_manager)
+        handle_key_press(key, tello, registry)
 
+    print(tracer.summary())
+    tracer.dump()
     cv2.destroyAllWindows()
     tello.end()
 
-def handle_key_press(key, tello, model_manager):
+def handle_key_press(key, tello, registry):
     # Movement controls
     if key == ord('l'):
         tello.land()
@@ -69,19 +100,24 @@ def handle_key_press(key, tello, model_manager):
     elif key == ord('e'):
         tello.rotate_clockwise(30)
 
-    # Model switching
+    # Model switching, loads in the background and swaps in between frames
     elif key == ord('1'):
-        model = torch.hub.load('ultralytics/yolov5', 'yolov5s')
-        model_manager['model'] = model
-        model_manager['label'] = "Default"
+        registry.request('default')
     elif key == ord('2'):
-        model = torch.hub.load('yolov5', 'custom', path='colegi_best.pt', source='local')
-        model_manager['model'] = model
-        model_manager['label'] = "Custom-Epic-Teammates"
+        registry.request('colegi')
     elif key == ord('3'):
-        model = torch.hub.load('yolov5', 'custom', path='profesori_best.pt', source='local')
-        model_manager['model'] = model
-        model_manager['label'] = "Cool-FILS-Professors"
+        registry.request('profesori')
+
+def create_model_registry():
+    """Register the selectable models; nothing is loaded yet."""
+    registry = ModelRegistry()
+    registry.register('default', "Default",
+                      lambda: torch.hub.load('ultralytics/yolov5', 'yolov5s'))
+    registry.register('colegi', "Custom-Epic-Teammates",
+                      lambda: torch.hub.load('yolov5', 'custom', path='colegi_best.pt', source='local'))
+    registry.register('profesori', "Cool-FILS-Professors",
+                      lambda: torch.hub.load('yolov5', 'custom', path='profesori_best.pt', source='local'))
+    return registry
 
 def main():
     tello = Tello()
@@ -89,12 +125,13 @@ def main():
     tello.streamon()
     print(tello.get_battery())
 
-    model = torch.hub.load('ultralytics/yolov5', 'yolov5s')
-    model_manager = {'model': model, 'label': "Default"}
+    registry = create_model_registry()
+    registry.request('default')
+    registry.preload('colegi', 'profesori')  # Ready before anybody presses 2 or 3
 
     global stop_thread
     stop_thread = False
-    thread = Thread(target=detect_objects, args=(tello, model_manager))
+    thread = Thread(target=detect_objects, args=(tello, registry))
     thread.start()
     try:
         while thread.is_alive():
@@ -102,6 +139,7 @@ def main():
     except KeyboardInterrupt:
         stop_thread = True
         thread.join()
+    registry.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def model_size(model):
+    """Approximate memory held by a torch model, in bytes."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelRegistry:
+    """
+    Loads detection models on a background thread and keeps the most recently
+    used ones in memory, evicting the least recently used beyond a memory budget.
+    The detection loop reads the active model once per frame with current(),
+    so a switch never interrupts a frame and never waits for a load.
+    """
+
+    def __init__(self, memory_budget_mb=1024):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.specs = {}  # key -> (label, loader)
+        self.models = OrderedDict()  # key -> (model, size), least recently used first
+        self.active = (None, None)  # (model, label), replaced as a whole
+        self.requested = None
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+
+    def register(self, key, label, loader):
+        self.specs[key] = (label, loader)
+
+    def preload(self, *keys):
+        """Start loading models in the background without activating them."""
+        for key in keys:
+            self._submit(key)
+
+    def request(self, key):
+        """Make key the active model as soon as it is loaded. Never blocks."""
+        with self.lock:
+            self.requested = key
+            if key in self.models:
+                self._activate(key)
+                return
+        self._submit(key)
+
+    def current(self):
+        """Return (model, label) of the active model."""
+        return self.active
+
+    def pending_label(self):
+        """Label of a requested model that is still loading, or None."""
+        with self.lock:
+            if self.requested is None or self.requested in self.models:
+                return None
+            return self.specs[self.requested][0]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, key):
+        with self.lock:
+            if key in self.models or key in self.loading:
+                return
+            self.loading[key] = self.executor.submit(self._load, key)
+
+    def _load(self, key):
+        label, loader = self.specs[key]
+        try:
+            model = loader()
+        except Exception as e:
+            print(f"Could not load model {label}: {e}")
+            with self.lock:
+                self.loading.pop(key, None)
+                if self.requested == key:
+                    self.requested = None
+            return
+
+        size = model_size(model)
+        with self.lock:
+            self.loading.pop(key, None)
+            self.models[key] = (model, size)
+            self.models.move_to_end(key, last=False)  # Preloaded models are evicted first
+            if self.requested == key or self.active[0] is None:
+                self._activate(key)
+            self._evict()
+
+    def _activate(self, key):
+        # Called with the lock held. A fallback activation (first model to finish loading) keeps
+        # the user's pending request, so the requested model still takes over once it is loaded.
+        self.models.move_to_end(key)
+        self.active = (self.models[key][0], self.specs[key][0])
+        if self.requested == key:
+            self.requested = None
+
+    def _evict(self):
+        # Called with the lock held; the active model is never evicted
+        total = sum(size for _, size in self.models.values())
+        for key in list(self.models):
+            if total <= self.memory_budget:
+                break
+            model, size = self.models[key]
+            if model is self.active[0]:
+                continue
+            del self.models[key]
+            total -= size
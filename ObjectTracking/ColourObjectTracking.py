@@ -1,11 +1,27 @@
 import cv2
 import pygame
 import numpy as np
+import sys
+import threading
 import time
+from pathlib import Path
 
 from djitellopy import Tello
 from pygame.locals import *
 
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon.DisplaySink import DisplaySink
+from DroneCommon.FrameMailbox import LatestFrameMailbox
+from DroneCommon.FrameTrace import FrameTracer
+from DroneCommon.RateMeter import RateMeter
+from DroneCommon.TextSprites import TextSpriteCache
+from SearchWindow import KalmanSearchWindow
+from ColourSegmenter import LutSegmenter
+
 
 
 
@@ -37,6 +53,7 @@ class FrontEnd(object):
         self.internalSpeed = 100
         self.FPS = 20
         self.hud_size = (800, 600)
+        self.pipelined = True   # capture, tracking and display on separate threads
 
 
         # config of controllable parameters
@@ -68,6 +85,10 @@ class FrontEnd(object):
         self.current_color = np.array(self.color_lower['blue']) + np.array(self.color_upper['blue'])
         for i in range(0,3): self.current_color[i] = self.current_color[i] / 2
         self.crange = (10, 50, 50)
+        self.roi_tracking = True    # segment a downscaled search window instead of the full hud
+        self.track_scale = 0.5      # downscale factor used by the roi tracker
+        self.lut_segmentation = True    # classify pixels with a precomputed RGB lookup table
+        self.lut_drift = 4      # HSV units the tracked colour may drift before the lookup table is rebuilt
 
         # other params (no need to config)
         self.current_parameter = 0
@@ -85,10 +106,18 @@ class FrontEnd(object):
         self.yaw_velocity = 0
         self.send_rc_control = False
         self.isTracking = False
+        self.stage_rates = {}
+        self.search_window = KalmanSearchWindow(self.hud_size)
+        self.segmenter = LutSegmenter()
+        self.segment_color = None   # colour the lookup table was last built for
+        self.tracer = FrameTracer('colour_tracking')
+        self.trace_id = None    # traced frame the current velocities were computed from
+        self.text = TextSpriteCache()    # hud lines are rasterised once and reused while they do not change
 
          # Creat pygame window
         pygame.display.set_caption("Tello video stream")
         self.screen = pygame.display.set_mode(self.hud_size)
+        self.display = DisplaySink(self.screen, 'RGB', cv2.INTER_AREA)
 
         # create update timer
         pygame.time.set_timer(USEREVENT + 1, 50)
@@ -121,53 +150,170 @@ class FrontEnd(object):
         frame_read = self.tello.get_frame_read()
 
         self.should_stop = False
-        while not self.should_stop:
+        if self.pipelined:
+            self.run_pipelined(frame_read)
+        else:
+            # frames are only used within one iteration, so they are converted into the same buffer every time
+            img = np.empty((self.hud_size[1], self.hud_size[0], 3), np.uint8)
+            while not self.should_stop:
+
+                # read frame
+                frame_id = self.tracer.begin()
+                cv2.resize(frame_read.frame, self.hud_size, dst=img, interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+                self.tracer.stamp(frame_id, 'preprocess')
+
+                # get output from tracking
+                if self.isTracking:
+                    self.track(img)
+                    self.tracer.stamp(frame_id, 'inference')
+                    self.tracer.stamp(frame_id, 'decision')
+                    self.trace_id = frame_id
+
+                # produce hud
+                self.show(img)
+
+                # handle input from dronet or user
+                self.handle_events(frame_read)
+
+                # wait a little
+                time.sleep(1 / self.FPS)
 
-            # read frame
-            img = cv2.cvtColor(frame_read.frame, cv2.COLOR_BGR2RGB)
-            img = cv2.resize(img, self.hud_size, interpolation=cv2.INTER_AREA)
+        print(self.tracer.summary())
+        self.tracer.dump()
+
+        # always call before finishing to deallocate resources
+        self.tello.end()
+
+
+    def run_pipelined(self, frame_read):
+        """
+        Pipelined main loop.
+        Capture and tracking run on their own threads and hand frames over through
+        single-slot mailboxes, so tracking always works on the newest frame and
+        the display (which stays on the main thread for pygame) never holds it back.
+        """
+        self.capture_box = LatestFrameMailbox()
+        self.display_box = LatestFrameMailbox()
+        self.stage_rates = {
+            'Capture': RateMeter(),
+            'Track': RateMeter(),
+            'Display': RateMeter(),
+        }
+
+        stages = [
+            threading.Thread(target=self.capture_stage, args=(frame_read,), daemon=True),
+            threading.Thread(target=self.track_stage, daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+
+        clock = pygame.time.Clock()
+        seq = 0
+        while not self.should_stop:
+            # show the newest tracked frame, if there is one
+            seq, img = self.display_box.get(seq, timeout=1 / self.FPS)
+            if img is not None:
+                self.show(img)
+                self.stage_rates['Display'].tick()
+
+            self.handle_events(frame_read)
+
+            # only the display is rate limited, the other stages run freely
+            clock.tick(self.FPS)
+
+        self.capture_box.close()
+        self.display_box.close()
+        for stage in stages:
+            stage.join()
+
+        print(self.format_stage_rates())
+        print("Frames dropped before tracking: {}, before display: {}".format(
+            self.capture_box.dropped, self.display_box.dropped))
+
+
+    def capture_stage(self, frame_read):
+        """ Convert every new drone frame to a hud sized RGB image and publish it."""
+        last = None
+        while not self.should_stop and not frame_read.stopped:
+            raw = frame_read.frame
+            if raw is None or raw is last:
+                time.sleep(0.001)
+                continue
+            last = raw
+
+            frame_id = self.tracer.begin()
+            # resize first so only the small image is converted, the new image is handed to the tracking thread
+            img = cv2.resize(raw, self.hud_size, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+            self.tracer.stamp(frame_id, 'preprocess')
+            self.capture_box.put((frame_id, img))
+            self.stage_rates['Capture'].tick()
+
+        self.capture_box.close()
+
+
+    def track_stage(self):
+        """ Track on the newest captured frame and react to it right away."""
+        seq = 0
+        while not self.should_stop:
+            seq, item = self.capture_box.get(seq, timeout=0.1)
+            if item is None:
+                if self.capture_box.closed:
+                    break
+                continue
+            frame_id, img = item
 
-            # get output from tracking
             if self.isTracking:
                 self.track(img)
+                self.tracer.stamp(frame_id, 'inference')
+                self.tracer.stamp(frame_id, 'decision')
+                self.trace_id = frame_id
+                # do not wait for the update timer, send the reaction now
+                self.send_input()
+
+            self.display_box.put(img)
+            self.stage_rates['Track'].tick()
+
+
+    def show(self, img):
+        """ Display img with the hud drawn over it; the hud goes into the display surface, img stays untouched."""
+        self.display.show(img, self.write_hud)
 
-            # produce hud
-            self.frame = self.write_hud(img.copy())
-            self.frame = np.fliplr(self.frame)
-            self.frame = np.rot90(self.frame)
-            self.frame = pygame.surfarray.make_surface(self.frame)
-            self.screen.fill([0, 0, 0])
-            self.screen.blit(self.frame, (0, 0))
-            pygame.display.update()
-
-            # handle input from dronet or user
-            for event in pygame.event.get():
-                if event.type == USEREVENT + 1:
+
+    def handle_events(self, frame_read):
+        """ Handle pygame events: update timer, quit and keyboard input."""
+        for event in pygame.event.get():
+            if event.type == USEREVENT + 1:
+                # while pipelined tracking is active the track stage sends the rc commands
+                if not (self.pipelined and self.isTracking):
                     self.send_input()
-                elif event.type == QUIT:
+            elif event.type == QUIT:
+                self.should_stop = True
+            elif event.type == KEYDOWN:
+                if (event.key == K_ESCAPE) or (event.key == K_BACKSPACE):
                     self.should_stop = True
-                elif event.type == KEYDOWN:
-                    if (event.key == K_ESCAPE) or (event.key == K_BACKSPACE):
-                        self.should_stop = True
-                    else:
-                        self.keydown(event.key)
-                elif event.type == KEYUP:
-                        self.keyup(event.key)
-
-                # shutdown stream
-                if frame_read.stopped:
-                    frame_read.stop()
-                    break
+                else:
+                    self.keydown(event.key)
+            elif event.type == KEYUP:
+                    self.keyup(event.key)
 
-            # wait a little
-            time.sleep(1 / self.FPS)
+            # shutdown stream
+            if frame_read.stopped:
+                frame_read.stop()
+                break
 
-        # always call before finishing to deallocate resources
-        self.tello.end()
+
+    def format_stage_rates(self):
+        """ One line with the measured rate of every pipeline stage."""
+        return " ".join("{}: {:4.1f}".format(name, meter.rate()) for name, meter in self.stage_rates.items())
 
 
     def track(self, frame):
 
+        if self.roi_tracking:
+            return self.track_roi(frame)
+
         # resize the frame, blur it, and convert it to the HSV
         # color space
         blurred = cv2.GaussianBlur(frame, (11, 11), 0)
@@ -185,10 +331,7 @@ class FrontEnd(object):
         image, cnts, hierarchy  = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL,
                                 cv2.CHAIN_APPROX_SIMPLE)
 
-        center = None
-
-        radius = 0
-        velocity = 0
+        blob = None
         # only proceed if at least one contour was found
         if len(cnts) > 0:
             # update color from mean color
@@ -209,25 +352,109 @@ class FrontEnd(object):
             M = cv2.moments(c)
 
             center = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+            blob = ((x, y), radius, center)
 
-            # only proceed if the radius meets a minimum size
-            if radius > 40:
-                # draw the circle and centroid on the frame,
-                # then update the list of tracked points
-                cv2.circle(frame, (int(x), int(y)), int(radius),
-                           (0, 255, 0), 2)
+        self.steer(frame, blob)
 
-                self.xoffset = int(center[0] - self.midx)
-                self.yoffset = int(self.midy - center[1])
-                velocity = clamp(self.target_radius - radius, -40, 60) / 100 * self.controll_params['Speed']
+
+    def track_roi(self, frame):
+        """
+        Cheaper variant of track.
+        Only a downscaled copy of the search window around the last blob is
+        segmented; the result is mapped back to hud coordinates.
+        """
+        scale = self.track_scale
+        x0, y0, x1, y1 = self.search_window.window(scale)
+
+        # crop is a view, only the downscaled copy is allocated
+        roi = cv2.resize(frame[y0:y1, x0:x1], None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        # blur kernel and morphology shrink together with the image
+        ksize = max(3, int(11 * scale) | 1)
+        iterations = max(1, int(round(3 * scale)))
+
+        blurred = cv2.GaussianBlur(roi, (ksize, ksize), 0)
+        self.central_color = self.sample_central_color(frame)
+
+        if self.lut_segmentation:
+            # the table is only rebuilt when the tracked colour drifted beyond lut_drift or was set
+            self.segmenter.set_ranges(self.segment_ranges())
+            mask = self.segmenter.mask(self.segmenter.classify(blurred), 1)
+        else:
+            hsv = cv2.cvtColor(blurred, cv2.COLOR_RGB2HSV)
+            mask = cv2.inRange(hsv, self.current_color - self.crange, self.current_color + self.crange)
+        mask = cv2.erode(mask, None, iterations=iterations)
+        mask = cv2.dilate(mask, None, iterations=iterations)
+
+        cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+        blob = None
+        if len(cnts) > 0:
+            # mean color of the masked pixels only
+            if self.lut_segmentation:
+                mean = np.uint8([[cv2.mean(blurred, mask=mask)[:3]]])
+                self.update_color(cv2.cvtColor(mean, cv2.COLOR_RGB2HSV)[0, 0, :])
             else:
-                self.xoffset = 0
-                self.yoffset = 0
-                velocity = 0
+                self.update_color(np.array(cv2.mean(hsv, mask=mask)))
+
+            c = max(cnts, key=cv2.contourArea)
+            ((x, y), radius) = cv2.minEnclosingCircle(c)
+            M = cv2.moments(c)
+            if M["m00"] > 0:
+                # back to hud coordinates
+                x = x0 + x / scale
+                y = y0 + y / scale
+                radius = radius / scale
+                center = (int(x0 + M["m10"] / M["m00"] / scale), int(y0 + M["m01"] / M["m00"] / scale))
+                blob = ((x, y), radius, center)
+
+        if blob is None:
+            self.search_window.miss()
         else:
-            self.xoffset = 0
-            self.yoffset = 0
-            velocity = 0
+            self.search_window.update(blob[2], blob[1])
+            cv2.rectangle(frame, (x0, y0), (x1 - 1, y1 - 1), (255, 255, 0), 1)
+
+        self.steer(frame, blob)
+
+
+    def segment_ranges(self):
+        """ HSV ranges for the segmenter, the tracked colour is label 1.
+        update_color moves the colour a little on nearly every frame, small drifts keep the current table.
+        """
+        if self.segment_color is None or np.abs(self.current_color - self.segment_color).max() > self.lut_drift:
+            self.segment_color = self.current_color.copy()
+        return [(self.segment_color - self.crange, self.segment_color + self.crange)]
+
+
+    def sample_central_color(self, frame):
+        """ Blurred HSV value of the central pixel, computed on a small patch only."""
+        patch = frame[self.midy - 5:self.midy + 6, self.midx - 5:self.midx + 6]
+        patch = cv2.GaussianBlur(patch, (11, 11), 0)
+        return cv2.cvtColor(patch, cv2.COLOR_RGB2HSV)[5, 5, :]
+
+
+    def steer(self, frame, blob):
+        """
+        Turn the tracked blob into velocities.
+        Arguments:
+            frame: hud image to draw the blob on
+            blob: ((x, y), radius, center) in hud coordinates or None
+        """
+        velocity = 0
+        self.xoffset = 0
+        self.yoffset = 0
+
+        # only proceed if the radius meets a minimum size
+        if blob is not None and blob[1] > 40:
+            (x, y), radius, center = blob
+            # draw the circle and centroid on the frame,
+            # then update the list of tracked points
+            cv2.circle(frame, (int(x), int(y)), int(radius),
+                       (0, 255, 0), 2)
+
+            self.xoffset = int(center[0] - self.midx)
+            self.yoffset = int(self.midy - center[1])
+            velocity = clamp(self.target_radius - radius, -40, 60) / 100 * self.controll_params['Speed']
 
         xfact = self.xoffset / self.hud_size[0] * self.controll_params['Speed'] * 2
         yfact = self.yoffset / self.hud_size[0] * self.controll_params['Speed'] * 2
@@ -286,11 +513,13 @@ class FrontEnd(object):
             self.should_stop = True
         elif key == pygame.K_t:      # arm tracking
             self.isTracking = not self.isTracking
+            self.search_window.reset()
             self.for_back_velocity = 0
             self.yaw_velocity = 0
             self.up_down_velocity = 0
         elif key == pygame.K_c:      # get new color
             self.set_color(self.central_color)
+            self.search_window.reset()
             self.for_back_velocity = 0
             self.yaw_velocity = 0
             self.up_down_velocity = 0
@@ -334,6 +563,8 @@ class FrontEnd(object):
         if self.send_rc_control:
             self.tello.send_rc_control(self.left_right_velocity, self.for_back_velocity, self.up_down_velocity,
                                        self.yaw_velocity)
+            if self.isTracking:
+                self.tracer.stamp(self.trace_id, 'command')
 
 
     def update_color(self, val):
@@ -348,11 +579,13 @@ class FrontEnd(object):
 
     def set_color(self, val):
         self.current_color = np.array(val)
+        self.segment_color = None
         print(val)
 
     def reset_color(self):
         self.current_color = np.array(self.color_lower[self.color_keys[self.controll_params['Color']]]) + np.array(self.color_upper[self.color_keys[self.controll_params['Color']]])
         for i in range(0,3): self.current_color[i] = self.current_color[i] / 2
+        self.segment_color = None
 
     def write_hud(self, frame):
         """Draw drone info and record on frame"""
@@ -367,11 +600,13 @@ class FrontEnd(object):
             img = cv2.circle(frame, (self.midx, self.midy), 10, (0,0,255), 1)
 
         stats.append(self.param_keys[self.current_parameter] + ": {:4.1f}".format(self.controll_params[self.param_keys[self.current_parameter]]))
+        if self.stage_rates:
+            stats.append(self.format_stage_rates())
         for idx, stat in enumerate(stats):
             text = stat.lstrip()
-            cv2.putText(frame, text, (0, 30 + (idx * 30)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        1.0, (255, 0, 0), lineType=30)
+            self.text.put(frame, text, (0, 30 + (idx * 30)),
+                          cv2.FONT_HERSHEY_SIMPLEX,
+                          1.0, (255, 0, 0), line_type=30)
         return frame
 
     def draw_arrows(self, frame):
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+
+class LutSegmenter(object):
+    """ Classifies RGB pixels into colour classes with a single table lookup.
+        The RGB cube is quantized to `bits` per channel. The HSV value of every
+        cell is computed once; when the thresholds change only the
+        class table is rebuilt from it, which costs one inRange over 2^(3*bits)
+        entries instead of a colour conversion of the whole frame.
+        Class 0 is background, class i + 1 belongs to the i-th (lower, upper)
+        HSV range; when ranges overlap the earlier one wins.
+    """
+
+    def __init__(self, bits=5):
+        self.bits = bits
+        self.shift = 8 - bits
+        self.index_type = np.uint16 if 3 * bits <= 16 else np.uint32
+
+        # HSV value of the centre of every quantized RGB cell, laid out as an image
+        levels = 1 << bits
+        centres = (np.arange(levels, dtype=np.uint16) << self.shift) + ((1 << self.shift) >> 1)
+        r, g, b = np.meshgrid(centres, centres, centres, indexing='ij')
+        cube = np.stack([r, g, b], axis=-1).astype(np.uint8).reshape(levels * levels, levels, 3)
+        self.cube_hsv = cv2.cvtColor(cube, cv2.COLOR_RGB2HSV)
+
+        self.lut = np.zeros(levels ** 3, np.uint8)
+        self.ranges = ()
+
+    def set_ranges(self, ranges):
+        """ Set the (lower, upper) HSV ranges, rebuilding the table only if they changed."""
+        ranges = tuple((tuple(int(v) for v in lower), tuple(int(v) for v in upper)) for lower, upper in ranges)
+        if ranges == self.ranges:
+            return
+        self.ranges = ranges
+
+        lut = np.zeros(self.cube_hsv.shape[:2], np.uint8)
+        for label in range(len(ranges), 0, -1):
+            lower, upper = ranges[label - 1]
+            lut[cv2.inRange(self.cube_hsv, lower, upper) > 0] = label
+        self.lut = lut.reshape(-1)
+
+    def classify(self, rgb):
+        """ Returns a label image with the class of every pixel of an RGB uint8 image."""
+        index = (rgb[:, :, 0] >> self.shift).astype(self.index_type) << (2 * self.bits)
+        index |= (rgb[:, :, 1] >> self.shift).astype(self.index_type) << self.bits
+        index |= rgb[:, :, 2] >> self.shift
+        return self.lut[index]
+
+    def mask(self, labels, label):
+        """ Binary 0/255 mask of one class, as cv2.inRange would return it."""
+        return cv2.inRange(labels, label, label)
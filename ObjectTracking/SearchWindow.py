@@ -0,0 +1,105 @@
+import math
+
+import cv2
+import numpy as np
+
+
+class KalmanSearchWindow(object):
+    """ Predicts where the tracked blob will be in the next frame and how large
+        a window has to be searched to find it again.
+        While the blob is lost the window keeps growing with the prediction
+        uncertainty; after max_misses frames the lock is dropped and the whole
+        frame is searched again.
+    """
+
+    def __init__(self, frame_size, growth=2.0, min_half_size=40, max_misses=5):
+        self.frame_size = frame_size
+        self.growth = growth
+        self.min_half_size = min_half_size
+        self.max_misses = max_misses
+
+        # constant velocity model over (x, y, vx, vy), measuring (x, y)
+        self.kalman = cv2.KalmanFilter(4, 2)
+        self.kalman.transitionMatrix = np.array([[1, 0, 1, 0],
+                                                 [0, 1, 0, 1],
+                                                 [0, 0, 1, 0],
+                                                 [0, 0, 0, 1]], np.float32)
+        self.kalman.measurementMatrix = np.array([[1, 0, 0, 0],
+                                                  [0, 1, 0, 0]], np.float32)
+        self.kalman.processNoiseCov = np.diag([4, 4, 25, 25]).astype(np.float32)
+        self.kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * 4
+
+        self.reset()
+
+    def reset(self):
+        """ Drop the lock, the next window is the full frame."""
+        self.locked = False
+        self.misses = 0
+        self.radius = 0
+
+    def window(self, scale=1.0):
+        """ Returns the (x0, y0, x1, y1) region to search in the current frame.
+        Must be called once per frame, followed by either update or miss.
+        scale is the factor the caller downscales the window by; the window is
+        kept large enough that it never shrinks to nothing.
+        """
+        width, height = self.frame_size
+        if not self.locked:
+            return 0, 0, width, height
+
+        prediction = self.kalman.predict()
+        # a blob leaving the frame is predicted outside of it, search at the border instead
+        px = clamp(float(prediction[0, 0]), 0, width - 1)
+        py = clamp(float(prediction[1, 0]), 0, height - 1)
+        sx = float(np.sqrt(self.kalman.errorCovPre[0, 0]))
+        sy = float(np.sqrt(self.kalman.errorCovPre[1, 1]))
+
+        base = max(self.min_half_size, self.radius * self.growth)
+        half_w = base + 3 * sx
+        half_h = base + 3 * sy
+
+        minimum = max(2 * self.min_half_size, math.ceil(1 / scale))
+        x0, x1 = span(px, half_w, width, minimum)
+        y0, y1 = span(py, half_h, height, minimum)
+        if x1 - x0 < minimum or y1 - y0 < minimum:
+            # frame smaller than the minimum window, fall back to a full search
+            self.reset()
+            return 0, 0, width, height
+        return x0, y0, x1, y1
+
+    def update(self, center, radius):
+        """ Feed the blob found in this frame, in full frame coordinates."""
+        measurement = np.array([[center[0]], [center[1]]], np.float32)
+        if self.locked:
+            self.kalman.correct(measurement)
+        else:
+            self.kalman.statePost = np.array([[center[0]], [center[1]], [0], [0]], np.float32)
+            self.kalman.errorCovPost = np.eye(4, dtype=np.float32) * 10
+            self.locked = True
+        self.radius = radius
+        self.misses = 0
+
+    def miss(self):
+        """ Nothing was found in the window of this frame."""
+        if not self.locked:
+            return
+        self.misses += 1
+        if self.misses > self.max_misses:
+            self.reset()
+
+
+def span(center, half, size, minimum):
+    """ Interval of at least minimum pixels around center inside [0, size),
+    shifted inwards at the borders instead of being cut short."""
+    half = max(half, minimum / 2)
+    lo = int(clamp(center - half, 0, size))
+    hi = int(clamp(center + half, 0, size))
+    if hi - lo < minimum:
+        if lo == 0:
+            hi = min(size, minimum)
+        else:
+            lo = max(0, hi - minimum)
+    return lo, hi
+
+
+def clamp(n, smallest, largest): return max(smallest, min(n, largest))
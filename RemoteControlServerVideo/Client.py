@@ -1,36 +1,58 @@
 import cv2
 import socket
-import struct
+import sys
+import threading
+from pathlib import Path
 import numpy as np
 from pynput import keyboard
 
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon import Protocol
+
+key_seq = 0
+# The receive loop (acks) and the keyboard listener thread (keys) share the socket, whole messages must not interleave
+send_lock = threading.Lock()
+
 def receive_video_frames(server_socket):
-    payload_size = struct.calcsize("!Q")  # Using unsigned long long in network byte order
+    reader = Protocol.MessageReader(server_socket)
+    latency = Protocol.LatencyMonitor(max_delay=0.3)
     try:
         while True:
-            packed_msg_size = server_socket.recv(payload_size)
-            if not packed_msg_size:
-                break
+            message = reader.read()
+            if message is None:
+                break  # Connection has been lost
 
-            msg_size = struct.unpack("!Q", packed_msg_size)[0]
-            frame_data = b''
-            while len(frame_data) < msg_size:
-                packet = server_socket.recv(msg_size - len(frame_data))
-                if not packet:
-                    return  # Connection has been lost
-                frame_data += packet
+            if message.type == Protocol.TELEMETRY:
+                print("Telemetry:", Protocol.unpack_telemetry(message.payload))
+                continue
+            if message.type != Protocol.VIDEO:
+                continue
+            send_message(server_socket, Protocol.pack(Protocol.ACK, seq=message.seq))
+            if not latency.observe(message.timestamp):
+                continue  # Too old to be worth decoding
 
-            frame = cv2.imdecode(np.frombuffer(frame_data, np.uint8), cv2.IMREAD_COLOR)
+            frame = cv2.imdecode(np.frombuffer(message.payload, np.uint8), cv2.IMREAD_COLOR)
             cv2.imshow('Client Video', frame)
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
     finally:
+        print(f"Video received: {reader.stream.frames.count} messages, {reader.report()}, {latency.stale} stale frames dropped")
         cv2.destroyAllWindows()
         server_socket.close()
 
+def send_message(server_socket, data):
+    with send_lock:
+        server_socket.sendall(data)
+
 def send_key_data(server_socket, key_data):
-    message_size = struct.pack("!Q", len(key_data))
-    server_socket.sendall(message_size + key_data)
+    global key_seq
+    with send_lock:
+        key_seq += 1
+        server_socket.sendall(Protocol.pack(Protocol.KEY, key_data, key_seq))
 
 def on_press(key, server_socket):
     try:
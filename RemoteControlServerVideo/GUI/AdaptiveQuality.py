@@ -0,0 +1,131 @@
+import collections
+import threading
+import time
+
+
+class AdaptiveQuality:
+    """
+    Picks the JPEG quality and downscale factor for one video client.
+    Every frame the client shows is acknowledged by sequence number, so the number of frames still in flight
+    tells us how much is queued in the TCP path. A growing backlog, frames skipped by the sender or a throughput
+    that no longer keeps up with what we send steps the client down the ladder quickly, a clean link steps it
+    back up slowly.
+    """
+
+    # (JPEG quality, scale) from best to worst
+    LEVELS = ((90, 1.0), (80, 1.0), (70, 0.75), (60, 0.75), (50, 0.5), (40, 0.5), (30, 0.35))
+
+    def __init__(self, max_quality=90, min_quality=30, min_scale=0.35, max_unacked=3, upgrade_after=30,
+                 cooldown=0.5, window=1.0, max_in_flight=64):
+        self.levels = [level for level in self.LEVELS
+                       if min_quality <= level[0] <= max_quality and level[1] >= min_scale]
+        if not self.levels:
+            raise ValueError("No quality level within the configured bounds")
+        self.level = min(1, len(self.levels) - 1)  # Start one step below the best level
+        self.max_unacked = max_unacked  # Frames in flight before the link counts as congested
+        self.upgrade_after = upgrade_after  # Clean frames needed before stepping up
+        self.cooldown = cooldown  # Minimum time between two downgrades
+        self.window = window  # Seconds of history used for the throughput estimate
+        self.max_in_flight = max_in_flight  # Unacked frames remembered, older ones are forgotten
+
+        self.lock = threading.Lock()
+        self.in_flight = collections.OrderedDict()  # seq -> (size, send time)
+        self.sent_log = collections.deque()  # (time, size) of recent sends
+        self.acked_log = collections.deque()  # (time, size) of recent acks
+        self.acks_seen = False
+        self.newest = -1  # Highest seq handed to the socket
+        self.clean_frames = 0
+        self.last_change = 0.0
+        self.rtt = None
+        self.downgrades = 0
+        self.upgrades = 0
+
+    @property
+    def setting(self):
+        """Current (quality, scale) pair, used by the broadcaster to share encodes between clients."""
+        return self.levels[self.level]
+
+    def sent(self, seq, size):
+        """Record a frame that was handed to the socket."""
+        now = time.monotonic()
+        with self.lock:
+            self.newest = max(self.newest, seq)
+            # Clients that never ack would otherwise grow the table forever
+            if self.acks_seen:
+                self.in_flight[seq] = (size, now)
+                while len(self.in_flight) > self.max_in_flight:
+                    self.in_flight.popitem(last=False)
+            self.sent_log.append((now, size))
+            self._trim(self.sent_log, now)
+            self._adjust(now)
+
+    def skipped(self, count):
+        """The sender could not keep up and the newest frame replaced older ones."""
+        if count > 0:
+            with self.lock:
+                self._step_down(time.monotonic())
+
+    def ack(self, seq):
+        """The client displayed frame seq, everything sent before it has left the network."""
+        now = time.monotonic()
+        with self.lock:
+            if seq > self.newest:
+                return  # Never sent: a bogus ack must not clear every frame in flight
+            self.acks_seen = True
+            while self.in_flight:
+                first = next(iter(self.in_flight))
+                if first > seq:
+                    break
+                size, sent_time = self.in_flight.pop(first)
+                self.acked_log.append((now, size))
+                if first == seq:
+                    sample = now - sent_time
+                    self.rtt = sample if self.rtt is None else 0.8 * self.rtt + 0.2 * sample
+            self._trim(self.acked_log, now)
+
+    def throughput(self):
+        """Bytes per second the client acknowledged over the last window."""
+        with self.lock:
+            self._trim(self.acked_log, time.monotonic())
+            return sum(size for _, size in self.acked_log) / self.window
+
+    def report(self):
+        quality, scale = self.setting
+        rtt = f"{self.rtt * 1000:.0f} ms" if self.rtt is not None else "n/a"
+        return (f"quality {quality}, scale {scale:.2f}, rtt {rtt}, {self.throughput() / 1024:.0f} KiB/s, "
+                f"{self.downgrades} downgrades, {self.upgrades} upgrades")
+
+    def _trim(self, log, now):
+        while log and now - log[0][0] > self.window:
+            log.popleft()
+
+    def _adjust(self, now):
+        if not self.acks_seen:
+            return  # Client does not ack (yet), only sender skips can lower the quality
+
+        unacked = len(self.in_flight)
+        if unacked > self.max_unacked:
+            self._step_down(now)
+            return
+
+        self.clean_frames += 1
+        if self.clean_frames < self.upgrade_after or unacked > 1:
+            return
+        sent_rate = sum(size for _, size in self.sent_log)
+        acked_rate = sum(size for _, size in self.acked_log)
+        if acked_rate >= 0.9 * sent_rate and self.level > 0:
+            self.level -= 1
+            self.upgrades += 1
+            self.clean_frames = 0
+            self.last_change = now
+
+    def _step_down(self, now):
+        self.clean_frames = 0
+        # Give the previous change time to show up in the acks before reacting again
+        if now - self.last_change < max(self.cooldown, self.rtt or 0.0):
+            return
+        if self.level < len(self.levels) - 1:
+            self.level = min(self.level + 2, len(self.levels) - 1)
+            self.downgrades += 1
+            self.last_change = now
+            self.in_flight.clear()  # Old frames would count against the new level
@@ -1,12 +1,27 @@
 import tkinter as tk
 from tkinter import messagebox
+import ipaddress
+import json
 import socket
-import struct
-import numpy as np
+import sys
+import threading
+import time
+from pathlib import Path
 import cv2
 from PIL import Image, ImageTk
 from pynput import keyboard
 
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[2]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon import DatagramVideo, Protocol
+from DroneCommon.FrameMailbox import LatestFrameMailbox
+from DroneCommon.RateMeter import RateMeter
+from DroneCommon.SharedFrameRing import SharedFrameRing
+from DroneCommon.TileCodec import TileCanvas
+
 
 class DroneClientApp:
     def __init__(self, master):
@@ -48,6 +63,10 @@ class DroneClientApp:
                                            state=tk.DISABLED, **self.round_button_style)
         self.disconnect_button.pack(side=tk.LEFT, padx=5)
 
+        # Status Bar
+        self.stats_label = tk.Label(master, text="", anchor="w", bg="#e3f2fd")
+        self.stats_label.pack(side=tk.BOTTOM, fill=tk.X)
+
         # Video Display Area
         self.video_label = tk.Label(master)
         self.video_label.pack()
@@ -58,6 +77,33 @@ class DroneClientApp:
 
         # Client Socket
         self.client_socket = None
+        self.reader = None
+        self.display_size = (960, 720)  # Frames the server sent downscaled are shown at this size
+        self.latency = Protocol.LatencyMonitor(max_delay=0.3)  # Frames later than this are dropped undecoded
+        self.key_seq = 0
+        self.telemetry = {}
+
+        # Video pipeline: network thread -> canvas queue -> decode thread -> decoded mailbox -> Tk
+        self.send_lock = threading.Lock()  # Acks from the network thread and keys from the listener share the socket
+        self.canvas = None
+        self.encoded = None  # Wakes the decode thread when the canvas queue has something new
+        self.decoded = None
+        self.displayed_seq = 0
+        self.display_rate = RateMeter()
+        self.decode_time = 0.0
+        self.display_interval = 15  # ms between checks for a new decoded frame
+
+        # Video over UDP: a lost packet only costs its own frame instead of stalling every later one over TCP
+        self.udp_video = False
+        self.udp_socket = None
+        self.reassembler = None
+
+        # Tile video: the server only sends the parts of the image that changed, ideal while hovering
+        self.tile_video = False
+
+        # Shared memory: picked automatically when the server runs on this machine, no JPEG and no socket
+        self.shared_memory = True
+        self.ring = None
 
     def connect(self):
         server_ip = self.server_ip_entry.get().strip()
@@ -67,10 +113,19 @@ class DroneClientApp:
         try:
             self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.client_socket.connect((server_ip, 8040))
+            self.reader = Protocol.MessageReader(self.client_socket)
             self.status_label.config(text="Client Status: Connected")
             self.connect_button.config(state=tk.DISABLED)
             self.disconnect_button.config(state=tk.NORMAL)
-            self.receive_video_frames()
+            self.canvas = TileCanvas()
+            self.encoded = LatestFrameMailbox()
+            self.decoded = LatestFrameMailbox()
+            self.displayed_seq = 0
+            threading.Thread(target=self.receive_video_frames, args=(self.reader, self.encoded), daemon=True).start()
+            if self.udp_video or self.tile_video or self.is_local():
+                self.subscribe()
+            threading.Thread(target=self.decode_frames, args=(self.encoded, self.decoded), daemon=True).start()
+            self.update_display()
         except Exception as e:
             messagebox.showerror("Connection Failed", str(e))
 
@@ -78,42 +133,166 @@ class DroneClientApp:
         if self.client_socket:
             self.client_socket.close()
             self.client_socket = None
+            if self.udp_socket:
+                self.udp_socket.close()
+                self.udp_socket = None
+            self.encoded.close()
+            self.decoded.close()
+            self.ring = None  # The reader thread closes it once it notices
             self.status_label.config(text="Client Status: Disconnected")
             self.connect_button.config(state=tk.NORMAL)
             self.disconnect_button.config(state=tk.DISABLED)
             self.video_label.image = None
 
-    def receive_video_frames(self):
-        if self.client_socket:
-            payload_size = struct.calcsize("!Q")
-            packed_msg_size = self.client_socket.recv(payload_size)
-            if not packed_msg_size:
-                return
-
-            msg_size = struct.unpack("!Q", packed_msg_size)[0]
-            frame_data = b''
-            while len(frame_data) < msg_size:
-                packet = self.client_socket.recv(msg_size - len(frame_data))
-                if not packet:
-                    return  # Connection has been lost
-                frame_data += packet
-
-            frame = cv2.imdecode(np.frombuffer(frame_data, np.uint8), cv2.IMREAD_COLOR)
+    def receive_video_frames(self, reader, encoded):
+        # Network thread: only receives, acknowledges and hands the newest fresh JPEG to the decoder
+        try:
+            while True:
+                message = reader.read()
+                if message is None:
+                    break  # Connection has been lost
+
+                if message.type == Protocol.TELEMETRY:
+                    self.telemetry = Protocol.unpack_telemetry(message.payload)
+                    continue
+                if message.type in (Protocol.VIDEO, Protocol.TILES):
+                    self.handle_video(message, encoded)
+                elif message.type == Protocol.SHARED_MEMORY:
+                    self.ring = SharedFrameRing.attach(json.loads(str(message.payload, 'utf-8'))['name'])
+                    threading.Thread(target=self.receive_shared_frames, args=(self.ring, self.decoded),
+                                     daemon=True).start()
+        except (OSError, Protocol.ProtocolError):
+            pass  # Socket closed by disconnect
+        finally:
+            encoded.close()
+
+    def handle_video(self, message, encoded):
+        # Acknowledge even stale frames, they have left the network and the server adapts quality on acks
+        self.send_message(Protocol.ACK, seq=message.seq)
+        fresh = self.latency.observe(message.timestamp)
+        # Stale whole frames are dropped undecoded, tile updates never are since later ones build on them
+        if fresh or message.type == Protocol.TILES:
+            self.canvas.push(message.type, bytes(message.payload))  # The reader reuses its buffer
+            encoded.put(message.seq)
+
+    def is_local(self):
+        if not self.shared_memory:
+            return False
+        peer = self.client_socket.getpeername()[0]
+        return ipaddress.ip_address(peer).is_loopback or peer == self.client_socket.getsockname()[0]
+
+    def subscribe(self):
+        udp_port = 0
+        if self.udp_video and not self.tile_video:  # The server sends tiles over TCP, a lost delta would corrupt them
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)  # Room for a few whole frames
+            self.udp_socket.bind(('', 0))
+            udp_port = self.udp_socket.getsockname()[1]
+            self.reassembler = DatagramVideo.FrameReassembler(deadline=0.1)
+            threading.Thread(target=self.receive_video_datagrams,
+                             args=(self.udp_socket, self.reassembler, self.encoded), daemon=True).start()
+        self.send_raw(Protocol.pack_subscribe(udp_port, self.tile_video, self.is_local()))
+
+    def receive_video_datagrams(self, udp_socket, reassembler, encoded):
+        # Second network thread: rebuilds frames from datagrams, incomplete or superseded frames never reach decode
+        buffer = bytearray(2048)
+        try:
+            while True:
+                count = udp_socket.recv_into(buffer)
+                frame = reassembler.add(memoryview(buffer)[:count])
+                if frame is None:
+                    continue
+                message = Protocol.parse(frame[1])
+                if message.type in (Protocol.VIDEO, Protocol.TILES):
+                    self.handle_video(message, encoded)
+        except (OSError, Protocol.ProtocolError):
+            pass  # Socket closed by disconnect
+
+    def receive_shared_frames(self, ring, decoded):
+        # Replaces the network and decode threads for a local server: converts straight out of shared memory
+        seq = 0
+        try:
+            while self.ring is ring and not decoded.closed:
+                shared = ring.read(seq)
+                if shared is None:
+                    time.sleep(0.002)
+                    continue
+                seq, timestamp, view, token = shared
+
+                start = time.perf_counter()
+                frame = cv2.cvtColor(view, cv2.COLOR_BGR2RGB)
+                if frame.shape[1] != self.display_size[0]:
+                    frame = cv2.resize(frame, self.display_size, interpolation=cv2.INTER_LINEAR)
+                if not ring.valid(token):
+                    continue  # The server reused the slot while we were reading it
+                self.decode_time = time.perf_counter() - start
+                self.latency.observe(timestamp)
+                decoded.put(frame)
+        finally:
+            ring.close()
+
+    def decode_frames(self, encoded, decoded):
+        # Decode thread: applies everything queued on the canvas and produces an RGB array ready for display
+        seq = 0
+        while True:
+            seq, signal = encoded.get(seq)
+            if signal is None:
+                break  # Closed
+
+            start = time.perf_counter()
+            frame = self.canvas.apply(self.canvas.take())
+            if frame is None:
+                continue  # Tiles without a keyframe yet
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if frame.shape[1] != self.display_size[0]:
+                frame = cv2.resize(frame, self.display_size, interpolation=cv2.INTER_LINEAR)
+            self.decode_time = time.perf_counter() - start
+            decoded.put(frame)
+        decoded.close()
 
-            frame = Image.fromarray(frame)
-            frame = ImageTk.PhotoImage(frame)
+    def update_display(self):
+        # Tk thread: never blocks, only swaps in the newest decoded frame
+        if self.client_socket is None:
+            return
+        seq, frame = self.decoded.peek()
+        if seq > self.displayed_seq:
+            self.decoded.get(self.displayed_seq, timeout=0)  # Marks the frame collected for the drop counter
+            self.displayed_seq = seq
+            frame = ImageTk.PhotoImage(Image.fromarray(frame))
             self.video_label.config(image=frame)
             self.video_label.image = frame
+            self.display_rate.tick()
+            self.update_stats()
+        elif self.decoded.closed:
+            self.disconnect()
+            self.status_label.config(text="Client Status: Connection lost")
+            return
+        self.master.after(self.display_interval, self.update_display)
 
-            self.master.after(10, self.receive_video_frames)
+    def update_stats(self):
+        dropped = self.canvas.dropped + self.decoded.dropped + self.latency.stale
+        stats = (f"{self.display_rate.rate():.1f} fps shown, received {self.reader.report()}, "
+                 f"decode {self.decode_time * 1000:.1f} ms, latency {self.latency.latency * 1000:.0f} ms, "
+                 f"{dropped} dropped, battery {self.telemetry.get('bat', '?')}%")
+        if self.udp_socket:
+            stats += f", UDP {self.reassembler.expired + self.reassembler.superseded} incomplete"
+        self.stats_label.config(text=stats)
+
+    def send_message(self, message_type, payload=b'', seq=0):
+        self.send_raw(Protocol.pack(message_type, payload, seq))
+
+    def send_raw(self, data):
+        client_socket = self.client_socket
+        if client_socket is None:
+            return
+        with self.send_lock:
+            client_socket.sendall(data)
 
     def on_press(self, key):
         try:
             if hasattr(key, 'char') and key.char and self.client_socket:
-                key_data = key.char.encode()
-                message_size = struct.pack("!Q", len(key_data))
-                self.client_socket.sendall(message_size + key_data)
+                self.key_seq += 1
+                self.send_message(Protocol.KEY, key.char.encode(), self.key_seq)
         except Exception as e:
             print(f"Error sending key data: {e}")
 
@@ -1,11 +1,19 @@
 import tkinter as tk
 from tkinter import scrolledtext
+import queue
 import socket
-import struct
-import threading
+import sys
+from pathlib import Path
 import psutil
 from djitellopy import Tello
 
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[2]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from ServerCore import DroneServerCore
+
 class DroneServerApp:
     def __init__(self, master):
         self.master = master
@@ -55,10 +63,28 @@ class DroneServerApp:
         self.log_area.pack(fill=tk.BOTH, expand=True)
 
         # Server and drone initialization
-        self.server_socket = None
+        self.video_bounds = {'max_quality': 90, 'min_quality': 30, 'min_scale': 0.35}  # Limits for adaptive video
+        self.log_queue = queue.Queue()  # Server threads never touch Tk, they queue log lines for poll_log
         self.drone = Tello()
         self.drone.connect()
         self.drone.streamon()
+        self.core = DroneServerCore(self.drone, log=self.log_queue.put, port=8040, video_bounds=self.video_bounds,
+                                    telemetry_interval=1.0)
+        master.protocol("WM_DELETE_WINDOW", self.close)
+        self.poll_log()
+
+    def poll_log(self):
+        while True:
+            try:
+                message = self.log_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.log_message(message)
+        self.master.after(100, self.poll_log)
+
+    def close(self):
+        self.core.close()
+        self.master.destroy()
 
     def log_message(self, message):
         self.log_area.config(state=tk.NORMAL)
@@ -82,12 +108,7 @@ class DroneServerApp:
 
     def start_server(self):
         try:
-            selected_ip = self.selected_ip.get()
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.bind((selected_ip, 8040))
-            self.server_socket.listen(10)
-            self.log_message(f"Server is listening for incoming connections on {selected_ip}...")
-            threading.Thread(target=self.accept_clients, daemon=True).start()
+            self.core.start(self.selected_ip.get())
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             self.status_label.config(text="Server Status: Running")
@@ -98,84 +119,13 @@ class DroneServerApp:
             self.server_indicator.itemconfig(self.indicator_circle, fill="red")
 
     def stop_server(self):
-        if self.server_socket:
-            self.server_socket.close()
-            self.server_socket = None
-            self.log_message("Server stopped.")
+        if self.core.running:
+            self.core.stop()
             self.start_button.config(state=tk.NORMAL)
             self.stop_button.config(state=tk.DISABLED)
             self.status_label.config(text="Server Status: Not Started")
             self.server_indicator.itemconfig(self.indicator_circle, fill="red")
 
-    def accept_clients(self):
-        try:
-            while True:
-                client_socket, addr = self.server_socket.accept()
-                self.log_message(f"Client connected: {addr}")
-                frame_read = self.drone.get_frame_read()
-                threading.Thread(target=self.send_video_frames, args=(client_socket, frame_read)).start()
-                threading.Thread(target=self.receive_commands, args=(client_socket,)).start()
-        except Exception as e:
-            self.log_message(f"Error accepting clients: {str(e)}")
-
-    def send_video_frames(self, client_socket, frame_read):
-        try:
-            while True:
-                frame = frame_read.frame
-                if frame is None:
-                    self.log_message("Could not read frame from camera.")
-                    break
-                _, buffer = cv2.imencode('.jpg', frame)
-                serialized_frame = buffer.tobytes()
-                message_size = struct.pack("!Q", len(serialized_frame))
-                client_socket.sendall(message_size + serialized_frame)
-        except socket.error as e:
-            self.log_message(f"Socket error in sending frames: {str(e)}")
-        finally:
-            client_socket.close()
-            self.log_message("Video capture and socket closed after sending frames.")
-
-    def receive_commands(self, client_socket):
-        payload_size = struct.calcsize("!Q")
-        try:
-            while True:
-                packed_msg_size = client_socket.recv(payload_size)
-                if not packed_msg_size:
-                    self.log_message("Client has disconnected.")
-                    break
-
-                msg_size = struct.unpack("!Q", packed_msg_size)[0]
-                command_data = b''
-                while len(command_data) < msg_size:
-                    packet = client_socket.recv(msg_size - len(command_data))
-                    if not packet:
-                        self.log_message("Connection lost during command reception.")
-                        return  # Connection has been lost
-                    command_data += packet
-
-                self.execute_drone_command(command_data.decode())
-        finally:
-            client_socket.close()
-            self.log_message("Socket closed after receiving commands.")
-
-        def execute_drone_command(self, command):
-            drone_actions = {
-                'o': self.drone.takeoff,
-                'l': self.drone.land,
-                'w': lambda: self.drone.move_forward(30),
-                's': lambda: self.drone.move_back(30),
-                'a': lambda: self.drone.move_left(30),
-                'd': lambda: self.drone.move_right(30),
-                'i': lambda: self.drone.move_up(30),
-                'k': lambda: self.drone.move_down(30)
-            }
-            action = drone_actions.get(command)
-            if action:
-                action()
-                self.log_message(f"Executed drone command: {command}")
-            else:
-                self.log_message(f"Unknown command: {command}")
-
 def main():
     root = tk.Tk()
     app = DroneServerApp(root)
@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import socket
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[2]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon import DatagramVideo, Protocol
+from DroneCommon.TileCodec import TileEncoder
+from DroneCommon.FrameSource import FrameSource
+from DroneCommon.SharedFrameRing import SharedFrameRing
+from AdaptiveQuality import AdaptiveQuality
+from VideoBroadcaster import VideoBroadcaster
+
+
+class AsyncLatestMailbox:
+    """
+    Single-slot mailbox filled from the broadcaster thread and awaited on the event loop.
+    Same contract as LatestFrameMailbox, but readers are coroutines instead of blocked threads.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.event = asyncio.Event()
+        self.item = None
+        self.seq = 0
+        self.collected = 0
+        self.closed = False
+        self.dropped = 0  # Items overwritten before the sender collected them
+
+    def put(self, item):
+        with self.lock:
+            if self.seq > self.collected:
+                self.dropped += 1
+            self.seq += 1
+            self.item = item
+        self.wake()
+
+    def close(self):
+        self.closed = True
+        self.wake()
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  # Loop already closed, nobody is waiting any more
+
+    async def get(self, last_seq=0):
+        """Wait for an item newer than last_seq. Returns (seq, item), or (last_seq, None) once closed."""
+        while True:
+            with self.lock:
+                if self.seq > last_seq:
+                    self.collected = self.seq
+                    return self.seq, self.item
+            if self.closed:
+                return last_seq, None
+            # Safe without a lock: put() only sets the event from a callback that runs after this coroutine yields
+            self.event.clear()
+            await self.event.wait()
+
+
+class DroneServerCore:
+    """
+    Remote control server for one drone and any number of viewers/controllers.
+    All client sockets are multiplexed on a single asyncio event loop running in a background thread. Video writes
+    wait on drain(), so a slow client only builds up one frame in its mailbox, and blocking djitellopy calls run on a
+    dedicated single-thread executor, so commands from all clients reach the drone one at a time in arrival order.
+    A client can subscribe to receive its video as UDP datagrams instead, commands and acks stay on TCP (tile video
+    is always sent over TCP), and a client on the same machine can read raw frames from shared memory without any
+    encoding.
+    The front end (Tk or command line) only calls start() and stop() and receives log lines through `log`.
+    """
+
+    def __init__(self, drone, log=print, port=8040, video_bounds=None, telemetry_interval=1.0, udp_impairment=None):
+        self.drone = drone
+        self.log = log  # Called from the event loop thread, must be thread safe
+        self.port = port
+        self.video_bounds = video_bounds or {}
+        self.telemetry_interval = telemetry_interval  # Seconds between drone state messages to each client
+        self.drone_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="drone")
+        self.udp_impairment = udp_impairment  # LossyChannel settings for testing, e.g. {'loss': 0.05, 'delay': 0.02}
+
+        self.loop = None
+        self.thread = None
+        self.server = None
+        self.frame_source = None
+        self.broadcaster = None
+        self.clients = {}  # Peer address -> AdaptiveQuality
+        self.writers = set()
+        self.udp = None
+        self.udp_targets = {}  # Writer -> UDP address of clients that subscribed to datagram video
+        self.ring = None  # Created when the first local client asks for shared memory
+        self.ring_size = (960, 720)  # (width, height) of shared memory frames, the Tello stream size
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self, host):
+        """Start streaming and listening on host. Raises OSError if the address cannot be used."""
+        self.frame_source = FrameSource(self.drone.get_frame_read())
+        self.frame_source.start()
+        self.broadcaster = VideoBroadcaster(self.frame_source)
+        self.broadcaster.start()
+
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.setblocking(False)  # A full send buffer drops the datagram instead of stalling the loop
+        if self.udp_impairment:
+            self.udp = DatagramVideo.LossyChannel(self.udp, **self.udp_impairment)
+
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle_client, host, self.port))
+        except OSError:
+            self.loop.close()
+            self.udp.close()
+            self.broadcaster.stop()
+            self.frame_source.stop()
+            raise
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        self.log(f"Server is listening for incoming connections on {host}:{self.port}...")
+
+    def stop(self):
+        if not self.running:
+            return
+        self.broadcaster.stop()  # Closes every mailbox, senders finish on their own
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+        self.udp.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self.frame_source.stop()
+        self.log(f"Server stopped after {self.frame_source.seq} camera frames, "
+                 f"{self.broadcaster.frames_encoded} JPEG encodes.")
+
+    def close(self):
+        self.stop()
+        self.drone_executor.shutdown(wait=True)
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def shutdown(self):
+        # Closing the sockets ends every client handler, wait for them so nothing is left on the loop
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        while self.writers:
+            await asyncio.sleep(0.01)
+        await self.server.wait_closed()
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        self.log(f"Client connected: {addr}")
+        quality = AdaptiveQuality(**self.video_bounds)
+        mailbox = AsyncLatestMailbox(asyncio.get_running_loop())
+        self.broadcaster.add_client(quality, mailbox)
+        self.clients[addr] = quality
+        self.writers.add(writer)
+
+        tasks = [asyncio.ensure_future(self.send_video_frames(writer, mailbox, quality)),
+                 asyncio.ensure_future(self.send_telemetry(writer)),
+                 asyncio.ensure_future(self.receive_commands(reader, writer, mailbox, quality))]
+        try:
+            # Whichever side ends first (client gone, socket error, server stopping) ends the connection
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    if not isinstance(task.exception(), ConnectionError):  # A reset is just a client leaving
+                        self.log(f"Connection error with {addr}: {task.exception()}")
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.broadcaster.remove_client(mailbox)
+            del self.clients[addr]
+            self.udp_targets.pop(writer, None)
+            writer.close()
+            self.writers.discard(writer)
+            self.log(f"Client {addr} disconnected, {mailbox.dropped} frames skipped, {quality.report()}.")
+
+    async def send_video_frames(self, writer, mailbox, quality):
+        # Frames are encoded once by the broadcaster, this coroutine only sends the newest one
+        seq = 0
+        dropped = 0
+        while True:
+            seq, item = await mailbox.get(seq)
+            if item is None:
+                break
+            quality.skipped(mailbox.dropped - dropped)
+            dropped = mailbox.dropped
+            frame_seq, message, commit = item
+            if commit is not None and not commit():
+                continue  # Tile update built on a reference this client no longer has
+            target = self.udp_targets.get(writer)
+            if target is not None:
+                self.send_datagrams(frame_seq, message, target)
+            else:
+                writer.write(message)
+                await writer.drain()
+            quality.sent(frame_seq, len(message))
+
+    def send_datagrams(self, frame_seq, message, target):
+        for datagram in DatagramVideo.fragment(frame_seq, message):
+            try:
+                self.udp.sendto(datagram, target)
+            except (BlockingIOError, OSError):
+                return  # The rest of the frame would be useless without this fragment
+
+    async def send_telemetry(self, writer):
+        seq = 0
+        while True:
+            seq += 1
+            writer.write(Protocol.pack_telemetry(self.drone.get_current_state(), seq))
+            await writer.drain()
+            await asyncio.sleep(self.telemetry_interval)
+
+    async def receive_commands(self, reader, writer, mailbox, quality):
+        while True:
+            message = await Protocol.read_message(reader)
+            if message is None:
+                break
+
+            try:
+                self.handle_message(message, writer, mailbox, quality)
+            except (ValueError, struct.error) as e:
+                # A malformed message is dropped instead of ending the connection
+                self.log(f"Ignoring malformed {Protocol.TYPE_NAMES.get(message.type, message.type)} message: {e}")
+
+    def handle_message(self, message, writer, mailbox, quality):
+        if message.type == Protocol.ACK:
+            quality.ack(message.seq)  # Video feedback shares the command channel
+        elif message.type == Protocol.SUBSCRIBE:
+            udp_port, tiles, shared_memory = Protocol.unpack_subscribe(message.payload)
+            if shared_memory and self.is_local(writer):
+                self.share_frames(writer, mailbox)
+                return
+            if tiles:
+                # Tile deltas build on the frame before, one lost datagram would corrupt the client's image
+                # until the next keyframe, so tiles always go over TCP
+                udp_port = 0
+            if udp_port:
+                self.udp_targets[writer] = (writer.get_extra_info('peername')[0], udp_port)
+            else:
+                self.udp_targets.pop(writer, None)
+            self.broadcaster.set_tiles(mailbox, TileEncoder() if tiles else None)
+            self.log(f"Client {writer.get_extra_info('peername')} receives video over {'UDP' if udp_port else 'TCP'}"
+                     f"{' as tiles' if tiles else ''}.")
+        elif message.type == Protocol.KEY:
+            command = str(message.payload, 'utf-8')
+            future = self.loop.run_in_executor(self.drone_executor, self.execute_drone_command, command)
+            future.add_done_callback(self.command_done)
+        else:
+            self.log(f"Ignoring unexpected {Protocol.TYPE_NAMES.get(message.type, message.type)} message.")
+
+    def is_local(self, writer):
+        peer = writer.get_extra_info('peername')[0]
+        return ipaddress.ip_address(peer).is_loopback or peer == writer.get_extra_info('sockname')[0]
+
+    def share_frames(self, writer, mailbox):
+        if self.ring is None:
+            # Sized from the stream, not the current frame: that may be djitellopy's placeholder
+            self.ring = SharedFrameRing.create((self.ring_size[1], self.ring_size[0], 3))
+            self.broadcaster.ring = self.ring
+        self.broadcaster.set_local(mailbox, True)
+        writer.write(Protocol.pack(Protocol.SHARED_MEMORY, json.dumps({'name': self.ring.name}).encode()))
+        self.log(f"Client {writer.get_extra_info('peername')} reads video from shared memory.")
+
+    def command_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.log(f"Drone command failed: {future.exception()}")
+
+    def execute_drone_command(self, command):
+        drone_actions = {
+            'o': self.drone.takeoff,
+            'l': self.drone.land,
+            'w': lambda: self.drone.move_forward(30),
+            's': lambda: self.drone.move_back(30),
+            'a': lambda: self.drone.move_left(30),
+            'd': lambda: self.drone.move_right(30),
+            'i': lambda: self.drone.move_up(30),
+            'k': lambda: self.drone.move_down(30)
+        }
+        action = drone_actions.get(command)
+        if action:
+            action()
+            self.log(f"Executed drone command: {command}")
+        else:
+            self.log(f"Unknown command: {command}")
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="Run the drone remote control server without the Tk interface")
+    parser.add_argument('--host', default='0.0.0.0', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8040, help='port to listen on')
+    return parser.parse_args()
+
+
+def main(opt):
+    from djitellopy import Tello
+
+    drone = Tello()
+    drone.connect()
+    drone.streamon()
+    core = DroneServerCore(drone, port=opt.port)
+    core.start(opt.host)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        core.close()
+        drone.streamoff()
+
+
+if __name__ == '__main__':
+    main(parse_opt())
@@ -0,0 +1,123 @@
+import threading
+
+import cv2
+
+from DroneCommon import Protocol
+from DroneCommon.FrameMailbox import LatestFrameMailbox
+
+
+class Subscriber:
+    """One connected viewer as seen by the broadcaster."""
+
+    def __init__(self, mailbox, quality):
+        self.mailbox = mailbox
+        self.quality = quality
+        self.tiles = None  # TileEncoder when the client uses the tile codec
+        self.local = False  # Reads raw frames from the shared memory ring, nothing to encode
+
+
+class VideoBroadcaster:
+    """
+    Encodes every drone frame to JPEG once per quality setting in use and hands the framed message
+    (a protocol VIDEO message carrying the frame seq and capture time) to the clients on that setting.
+    Each client has its own single-slot mailbox, so a slow viewer only misses frames instead of holding back
+    the others. Clients using the tile codec get their own TileEncoder instead, since their updates depend on
+    what they were sent before, and clients on the same machine get raw frames through a SharedFrameRing.
+    """
+
+    def __init__(self, frame_source):
+        self.frame_source = frame_source  # Wakes the broadcaster only for genuinely new frames
+        self.clients = []
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.frames_encoded = 0
+        self.ring = None  # SharedFrameRing for local clients, owned by the server
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            for client in self.clients:
+                client.mailbox.close()
+            self.clients = []
+
+    def add_client(self, quality, mailbox=None):
+        """Register a viewer with its AdaptiveQuality and return the mailbox its sender reads from."""
+        if mailbox is None:
+            mailbox = LatestFrameMailbox()
+        with self.lock:
+            self.clients.append(Subscriber(mailbox, quality))
+        return mailbox
+
+    def set_tiles(self, mailbox, tiles):
+        """Switch a client to the tile codec with a TileEncoder, or back to whole frames with None."""
+        with self.lock:
+            for client in self.clients:
+                if client.mailbox is mailbox:
+                    client.tiles = tiles
+
+    def set_local(self, mailbox, local):
+        """Local clients read the shared memory ring, the broadcaster stops encoding for them."""
+        with self.lock:
+            for client in self.clients:
+                if client.mailbox is mailbox:
+                    client.local = local
+
+    def remove_client(self, mailbox):
+        with self.lock:
+            self.clients = [client for client in self.clients if client.mailbox is not mailbox]
+        mailbox.close()
+
+    def scale(self, frame, scale, scaled):
+        if scale == 1.0:
+            return frame
+        if scale not in scaled:
+            scaled[scale] = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return scaled[scale]
+
+    def encode(self, seq, frame, timestamp, quality):
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        serialized_frame = buffer.tobytes()
+        self.frames_encoded += 1
+        return Protocol.pack(Protocol.VIDEO, serialized_frame, seq, timestamp)
+
+    def run(self):
+        seq = 0
+        while self.running:
+            seq, frame, timestamp, _ = self.frame_source.wait(seq, timeout=0.1)
+            if frame is None:
+                continue
+
+            with self.lock:
+                clients = list(self.clients)
+            if not clients:
+                continue  # Nobody is watching, do not encode
+
+            if self.ring is not None and any(client.local for client in clients):
+                if frame.shape == self.ring.shape:
+                    self.ring.write(frame, timestamp)
+                else:
+                    # The ring's size is fixed, frames of any other size are scaled to fit
+                    self.ring.write(cv2.resize(frame, (self.ring.shape[1], self.ring.shape[0])), timestamp)
+
+            messages = {}  # Clients on the same setting share one encode
+            scaled = {}
+            for client in clients:
+                if client.local:
+                    continue
+                quality, scale = client.quality.setting
+                if client.tiles is not None:
+                    update = client.tiles.encode(seq, self.scale(frame, scale, scaled), timestamp, quality)
+                    if update is not None:
+                        client.mailbox.put((seq, update[0], update[1]))
+                    continue
+                if (quality, scale) not in messages:
+                    messages[quality, scale] = self.encode(seq, self.scale(frame, scale, scaled), timestamp, quality)
+                client.mailbox.put((seq, messages[quality, scale], None))
@@ -1,53 +1,114 @@
+import asyncio
 import cv2
-import socket
-import pickle
-import struct
+import sys
 import threading
+import time
+from pathlib import Path
+import numpy as np
 
-def handle_client_connection(client_socket):
-    payload_size = struct.calcsize("L")
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon import Protocol
+from DroneCommon.FrameMailbox import LatestFrameMailbox
+
+
+class Display(object):
+    """ Decodes and shows every client's video on a thread of its own.
+        imdecode, imshow and waitKey used to run in the connection coroutines and stalled the event loop that all
+        clients share. A handler now only drops the JPEG into its client's mailbox, so a display that falls behind
+        skips frames instead of holding up the network.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mailboxes = {}  # window name -> LatestFrameMailbox of JPEG payloads
+        self.quit = threading.Event()  # Set once 'q' was pressed in any window
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def open(self, window):
+        mailbox = LatestFrameMailbox()
+        with self.lock:
+            self.mailboxes[window] = mailbox
+        return mailbox
+
+    def run(self):
+        shown = {}  # window name -> seq of the frame on screen
+        while True:
+            with self.lock:
+                mailboxes = list(self.mailboxes.items())
+            for window, mailbox in mailboxes:
+                if mailbox.closed:
+                    with self.lock:
+                        if self.mailboxes.get(window) is mailbox:
+                            del self.mailboxes[window]
+                    if shown.pop(window, None) is not None:
+                        cv2.destroyWindow(window)
+                    continue
+                seq, payload = mailbox.peek()
+                if seq > shown.get(window, 0):
+                    frame = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+                    if frame is not None:
+                        cv2.imshow(window, frame)
+                    shown[window] = seq
+
+            if not shown:
+                time.sleep(0.01)  # waitKey returns at once without a window
+            elif cv2.waitKey(5) & 0xFF == ord('q'):
+                self.quit.set()
+
+
+display = Display()
+
+async def handle_client_connection(reader, writer):
+    client_address = writer.get_extra_info('peername')
+    print(f"[*] Accepted connection from {client_address}")
+    latency = Protocol.LatencyMonitor(max_delay=0.3)
+    frames = display.open(f'Server Video {client_address}')
+    messages = 0
     try:
         while True:
-            # Receive the message size
-            packed_msg_size = client_socket.recv(payload_size)
-            if not packed_msg_size:
-                break
-
-            msg_size = struct.unpack("L", packed_msg_size)[0]
-
-            # Receive the full message based on the message size
-            frame_data = b''
-            while len(frame_data) < msg_size:
-                packet = client_socket.recv(msg_size - len(frame_data))
-                if not packet:
-                    return  # Connection has been lost
-                frame_data += packet
-
-            # Attempt to unpickle and detect type of data
-            try:
-                frame = pickle.loads(frame_data)
-                cv2.imshow('Server Video', frame)
-            except Exception as e:
-                try:
-                    # Assume it is a key press if it fails to load as a frame
-                    key_press = frame_data.decode()
-                    print("Key Pressed:", key_press)
-                except UnicodeDecodeError:
-                    print("Failed to decode non-frame data:", frame_data)
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+            # Receive the full message, the header says what it is
+            message = await Protocol.read_message(reader)
+            if message is None:
+                break  # Connection has been lost
+            messages += 1
+
+            if message.type == Protocol.VIDEO:
+                writer.write(Protocol.pack(Protocol.ACK, seq=message.seq))
+                await writer.drain()
+                if latency.observe(message.timestamp):
+                    frames.put(message.payload)
+            elif message.type == Protocol.KEY:
+                print("Key Pressed:", str(message.payload, 'utf-8'))
+            elif message.type == Protocol.TELEMETRY:
+                print("Telemetry:", Protocol.unpack_telemetry(message.payload))
+    except (Protocol.ProtocolError, ConnectionError) as e:
+        print(f"Connection error with {client_address}: {e}")
     finally:
-        cv2.destroyAllWindows()
-        client_socket.close()
+        print(f"Connection with {client_address} closed after {messages} messages, "
+              f"{latency.stale} stale frames dropped")
+        frames.close()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
 
-# Set up server socket
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server_socket.bind(('192.168.31.217', 8050))
-server_socket.listen(10)
-print("Server is listening for incoming connections...")
+async def main():
+    # All clients share one event loop instead of a thread each
+    server = await asyncio.start_server(handle_client_connection, '192.168.31.217', 8050)
+    print("Server is listening for incoming connections...")
+    display.start()
+    async with server:
+        # Pressing 'q' in a video window stops the server
+        while not display.quit.is_set():
+            await asyncio.sleep(0.2)
 
-while True:
-    client_socket, client_address = server_socket.accept()
-    print(f"[*] Accepted connection from {client_address}")
-    threading.Thread(target=handle_client_connection, args=(client_socket,)).start()
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+
+from TelloSimulator import TelloSimulator
+
+# front end name -> (folder, module); every module has a pygame FrontEnd class
+FRONT_ENDS = {
+    'colour': ('ObjectTracking', 'ColourObjectTracking'),
+    'yolo': ('Yolo', 'YoloDroneControl'),
+    'yolo-mt': ('Yolo', 'YoloDroneTrackingMultiThreading'),
+}
+
+
+def simulated_tello(tello_class, simulator):
+    """ Subclass of the djitellopy Tello that talks to the simulator instead of the drone."""
+
+    class SimulatedTello(tello_class):
+        def __init__(self, *args, **kwargs):
+            kwargs['host'] = simulator.host
+            super().__init__(*args, **kwargs)
+            # the drone answers from the port it listens on; locally that port has to differ
+            # from the one djitellopy binds for its own replies
+            self.address = (simulator.host, simulator.command_port)
+
+        # FrontEnd scripts written against djitellopy 1.x check these for True,
+        # 2.x returns None on success and raises on failure
+        def connect(self, *args, **kwargs):
+            return super().connect(*args, **kwargs) in (None, True)
+
+        def set_speed(self, *args, **kwargs):
+            return super().set_speed(*args, **kwargs) in (None, True)
+
+        def streamon(self, *args, **kwargs):
+            return super().streamon(*args, **kwargs) in (None, True)
+
+        def streamoff(self, *args, **kwargs):
+            return super().streamoff(*args, **kwargs) in (None, True)
+
+    return SimulatedTello
+
+
+def play(schedule):
+    """ At the given (delay, action) offsets post a pygame key press or call the action."""
+    import pygame
+    start = time.monotonic()
+    for delay, action in schedule:
+        time.sleep(max(0.0, start + delay - time.monotonic()))
+        if callable(action):
+            action()
+        else:
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=action))
+            pygame.event.post(pygame.event.Event(pygame.KEYUP, key=action))
+
+
+def run(front_end, duration, warmup, **simulator_options):
+    """ Fly one front end against the simulator headlessly and return the measurements."""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+
+    folder, name = FRONT_ENDS[front_end]
+    for path in (ROOT, ROOT / folder):
+        if str(path) not in sys.path:
+            sys.path.append(str(path))  # add to PATH
+    module = importlib.import_module(name)
+
+    simulator = TelloSimulator(**simulator_options)
+    simulator.start()
+    module.Tello = simulated_tello(module.Tello, simulator)
+
+    # count what actually reaches the screen
+    displayed = []
+    update = pygame.display.update
+
+    def counting_update(*args):
+        displayed.append(time.monotonic())
+        return update(*args)
+
+    pygame.display.update = counting_update
+
+    try:
+        frontend = module.FrontEnd()
+        # take off, start tracking once the stream runs, only measure reactions
+        # to stimuli shown after tracking started, quit at the end
+        schedule = [
+            (warmup, pygame.K_TAB),
+            (warmup + 0.5, pygame.K_t),
+            (warmup + 0.5, simulator.reset_reactions),
+            (warmup + duration, pygame.K_ESCAPE),
+        ]
+        threading.Thread(target=play, args=(schedule,), daemon=True).start()
+        frontend.run()
+    finally:
+        pygame.display.update = update
+        simulator.stop()
+
+    report = simulator.report()
+    measured = [t for t in displayed if displayed and t >= displayed[-1] - duration]
+    report['display_fps'] = (len(measured) - 1) / (measured[-1] - measured[0]) if len(measured) > 1 else 0.0
+    report['front_end'] = front_end
+    return report
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="Benchmark the drone front ends against a local Tello simulator")
+    parser.add_argument('front_ends', nargs='*', default=list(FRONT_ENDS), choices=list(FRONT_ENDS))
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of tracking to measure')
+    parser.add_argument('--warmup', type=float, default=3.0, help='seconds before take off')
+    parser.add_argument('--fps', type=int, default=30, help='simulated camera frame rate')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated command latency in seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='simulated packet loss ratio')
+    parser.add_argument('--video', default=None, help='recorded video to stream instead of the synthetic ball')
+    # djitellopy 2.x hands out RGB frames which the front ends convert as if they were BGR, so the
+    # tracker sees these values as RGB; the default is the centre of the 'blue' colour preset
+    parser.add_argument('--ball-color', type=int, nargs=3, default=[17, 17, 152], help='colour of the synthetic ball')
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    return parser.parse_args()
+
+
+def main(opt):
+    results = []
+    for front_end in opt.front_ends:
+        results.append(run(front_end, opt.duration, opt.warmup, fps=opt.fps, command_latency=opt.latency,
+                           packet_loss=opt.loss, video=opt.video, ball_color=tuple(opt.ball_color)))
+
+    print("{:<10} {:>8} {:>10} {:>8} {:>10} {:>10} {:>10}".format(
+        'front end', 'fps', 'cmd/s', 'rc/s', 'react p50', 'react p95', 'reactions'))
+    for r in results:
+        ms = lambda v: '{:.1f}ms'.format(v * 1000) if v is not None else '-'
+        print("{:<10} {:>8.1f} {:>10.1f} {:>8.1f} {:>10} {:>10} {:>10}".format(
+            r['front_end'], r['display_fps'], r['command_rate'], r['rc_rate'],
+            ms(r['reaction_p50']), ms(r['reaction_p95']), r['reactions']))
+
+    if opt.json:
+        with open(opt.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(parse_opt())
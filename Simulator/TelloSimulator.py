@@ -0,0 +1,294 @@
+import collections
+import fractions
+import random
+import socket
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class TelloSimulator(object):
+    """ Local stand-in for a Tello drone.
+        Speaks the Tello SDK UDP protocol: text commands on the command port
+        (answered with "ok" or a value), the state string broadcast to port 8890
+        and a raw H.264 video stream to port 11111 after "streamon".
+        Video comes from a recorded file (looped) or is synthetic: a coloured
+        ball that jumps between the left and right of the image every
+        stimulus_period seconds, so the reaction latency of a tracking front
+        end can be measured from the first command that steers towards it.
+        Command latency and packet loss (applied to commands and video
+        datagrams alike) are configurable.
+    """
+
+    STATE_PORT = 8890
+    VIDEO_PORT = 11111
+    VIDEO_CHUNK = 1460   # the real drone sends the H.264 stream in datagrams of this size
+
+    def __init__(self, host='127.0.0.1', command_port=9889, fps=30, frame_size=(960, 720),
+                 command_latency=0.0, packet_loss=0.0, video=None, stimulus_period=2.0,
+                 ball_color=(152, 17, 17), seed=None):
+        self.host = host
+        self.command_port = command_port
+        self.fps = fps
+        self.frame_size = frame_size
+        self.command_latency = command_latency
+        self.packet_loss = packet_loss
+        self.video = video
+        self.stimulus_period = stimulus_period
+        self.ball_color = ball_color    # BGR
+        self.random = random.Random(seed)
+
+        self.state = {'bat': 87, 'h': 0, 'tof': 10, 'templ': 60, 'temph': 63}
+        self.flying = False
+        self.client = None
+        self.streaming = False
+        self.running = False
+
+        # counters
+        self.commands = collections.Counter()
+        self.first_command = None
+        self.last_command = None
+        self.frames_sent = 0
+        self.datagrams_lost = 0
+        self.reaction_latencies = []
+        self.stimulus = None    # (side, time the first frame showing it was sent), side is -1 or 1
+        self.reacted = True
+
+        self._replies = collections.deque()
+        self._replies_cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        self.running = True
+        self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.command_socket.bind((self.host, self.command_port))
+        self.command_socket.settimeout(0.2)
+        self.out_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for target in (self.command_loop, self.reply_loop, self.state_loop, self.video_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        with self._replies_cond:
+            self._replies_cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self.command_socket.close()
+        self.out_socket.close()
+
+    def lost(self):
+        """ Decide whether the next datagram is lost."""
+        if self.packet_loss > 0 and self.random.random() < self.packet_loss:
+            self.datagrams_lost += 1
+            return True
+        return False
+
+    # commands
+
+    def command_loop(self):
+        while self.running:
+            try:
+                data, address = self.command_socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if self.lost():
+                continue
+
+            # the command only takes effect once the simulated latency has passed
+            due = time.monotonic() + self.command_latency
+            with self._replies_cond:
+                self._replies.append((due, data.decode('utf-8', 'replace').strip(), address))
+                self._replies_cond.notify()
+
+    def reply_loop(self):
+        # latency is constant, so commands stay in arrival order
+        while self.running:
+            with self._replies_cond:
+                self._replies_cond.wait_for(lambda: self._replies or not self.running)
+                if not self.running:
+                    break
+                due, command, address = self._replies[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._replies_cond.wait(delay)
+                    continue
+                self._replies.popleft()
+
+            reply = self.execute(command, address)
+            if reply is not None:
+                self.out_socket.sendto(reply.encode('utf-8'), address)
+
+    def execute(self, command, address):
+        """ Apply a command and return the reply text, None for commands without reply."""
+        now = time.monotonic()
+        self.client = address[0]
+        parts = command.split()
+        name = parts[0] if parts else ''
+        self.commands[name] += 1
+        if self.first_command is None:
+            self.first_command = now
+        self.last_command = now
+
+        self.check_reaction(parts, now)
+
+        if name == 'rc':
+            return None
+        if name == 'streamon':
+            self.streaming = True
+        elif name == 'streamoff':
+            self.streaming = False
+        elif name == 'takeoff':
+            self.flying = True
+            self.state['h'] = 80
+        elif name in ('land', 'emergency'):
+            self.flying = False
+            self.state['h'] = 0
+        elif name.endswith('?'):
+            return self.query(name[:-1])
+        return 'ok'
+
+    def query(self, what):
+        values = {
+            'battery': self.state['bat'],
+            'height': '{}dm'.format(self.state['h'] // 10),
+            'temp': '{}~{}C'.format(self.state['templ'], self.state['temph']),
+            'tof': '{}mm'.format(self.state['tof'] * 10),
+            'speed': 100,
+            'time': '0s',
+            'wifi': 90,
+        }
+        return str(values.get(what, 'ok'))
+
+    def reset_reactions(self):
+        """ Forget measured reactions and wait for the next stimulus."""
+        self.reaction_latencies = []
+        self.reacted = True
+
+    def check_reaction(self, parts, now):
+        """ Record the latency of the first command steering towards the latest stimulus."""
+        if self.reacted or self.stimulus is None or not parts:
+            return
+        side, shown = self.stimulus
+        direction = 0
+        if parts[0] == 'rc' and len(parts) == 5:
+            direction = int(np.sign(float(parts[4]))) or int(np.sign(float(parts[1])))
+        elif parts[0] in ('right', 'cw'):
+            direction = 1
+        elif parts[0] in ('left', 'ccw'):
+            direction = -1
+        if direction == side:
+            self.reaction_latencies.append(now - shown)
+            self.reacted = True
+
+    # state
+
+    def state_loop(self):
+        while self.running:
+            time.sleep(0.1)
+            if self.client is None:
+                continue
+            state = ("pitch:0;roll:0;yaw:0;vgx:0;vgy:0;vgz:0;templ:{templ};temph:{temph};tof:{tof};"
+                     "h:{h};bat:{bat};baro:0.00;time:0;agx:0.00;agy:0.00;agz:-1000.00;\r\n").format(**self.state)
+            if not self.lost():
+                self.out_socket.sendto(state.encode('utf-8'), (self.client, self.STATE_PORT))
+
+    # video
+
+    def frames(self):
+        """ Endless BGR frames of frame_size, from the recording or synthetic."""
+        if self.video is not None:
+            capture = cv2.VideoCapture(self.video)
+            while self.running:
+                ok, frame = capture.read()
+                if not ok:
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                yield cv2.resize(frame, self.frame_size)
+            capture.release()
+            return
+
+        width, height = self.frame_size
+        background = np.full((height, width, 3), 110, np.uint8)
+        start = time.monotonic()
+        while self.running:
+            side = 1 if int((time.monotonic() - start) / self.stimulus_period) % 2 else -1
+            frame = background.copy()
+            cv2.circle(frame, (width // 2 + side * width // 4, height // 2), height // 6, self.ball_color, -1)
+            yield side, frame
+
+    def video_loop(self):
+        encoder = None
+        period = 1.0 / self.fps
+        next_frame = time.monotonic()
+        for item in self.frames():
+            side, frame = item if isinstance(item, tuple) else (None, item)
+
+            next_frame += period
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if not self.streaming or self.client is None:
+                continue
+
+            if encoder is None:
+                encoder = self.create_encoder()
+            video_frame = self.to_video_frame(frame)
+            video_frame.pts = self.frames_sent
+            for packet in encoder.encode(video_frame):
+                self.send_video(bytes(packet))
+            self.frames_sent += 1
+
+            if side is not None and (self.stimulus is None or self.stimulus[0] != side):
+                self.stimulus = (side, time.monotonic())
+                self.reacted = False
+
+    def create_encoder(self):
+        # PyAV is a dependency of djitellopy, which decodes this stream on the other end
+        import av
+        encoder = av.CodecContext.create('libx264', 'w')
+        encoder.width, encoder.height = self.frame_size
+        encoder.pix_fmt = 'yuv420p'
+        encoder.framerate = self.fps
+        encoder.time_base = fractions.Fraction(1, self.fps)
+        encoder.gop_size = self.fps    # like the drone, a keyframe every second so late joiners can decode
+        encoder.options = {'preset': 'ultrafast', 'tune': 'zerolatency'}
+        return encoder
+
+    def to_video_frame(self, frame):
+        import av
+        return av.VideoFrame.from_ndarray(frame, format='bgr24')
+
+    def send_video(self, data):
+        for start in range(0, len(data), self.VIDEO_CHUNK):
+            if not self.lost():
+                self.out_socket.sendto(data[start:start + self.VIDEO_CHUNK], (self.client, self.VIDEO_PORT))
+
+    # reporting
+
+    def report(self):
+        """ Measured command and video figures as a dict."""
+        elapsed = (self.last_command - self.first_command) if self.first_command is not None else 0
+        latencies = sorted(self.reaction_latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        return {
+            'commands': dict(self.commands),
+            'command_rate': sum(self.commands.values()) / elapsed if elapsed > 0 else 0.0,
+            'rc_rate': self.commands['rc'] / elapsed if elapsed > 0 else 0.0,
+            'frames_sent': self.frames_sent,
+            'datagrams_lost': self.datagrams_lost,
+            'reactions': len(latencies),
+            'reaction_p50': percentile(50),
+            'reaction_p95': percentile(95),
+            'reaction_max': latencies[-1] if latencies else None,
+        }
@@ -0,0 +1,120 @@
+import math
+import time
+
+import cv2
+import numpy as np
+
+
+class HybridDetector:
+    """
+    Runs the (slow) detector only every N frames and moves its boxes with sparse
+    optical flow in between. A fresh detection is also forced when the flow
+    tracker loses confidence. N adapts to the measured inference time so the
+    amortised cost per frame stays within the budget of target_fps.
+
+    Boxes are returned in the same (x1, y1, x2, y2, conf, cls) layout as the
+    detector, so callers do not need to know whether a frame was detected or
+    interpolated.
+    """
+
+    def __init__(self, detect, target_fps=15, max_interval=10, min_confidence=0.5, flow_scale=0.5):
+        self.detect = detect  # Callable(frame) -> np.ndarray of (x1, y1, x2, y2, conf, cls) rows
+        self.target_fps = target_fps
+        self.max_interval = max_interval
+        self.min_confidence = min_confidence
+        self.flow_scale = flow_scale  # Optical flow runs on a downscaled grayscale copy
+
+        self.interval = 1
+        self.inference_time = None  # Moving average of detector time in seconds
+        self.frames_since_detection = 0
+        self.confidence = 0.0
+        self.boxes = None
+        self.points = []  # Per box: float32 array of tracked points (flow coordinates)
+        self.prev_gray = None
+        self.detected = False  # Whether the last call ran the detector
+
+    def __call__(self, frame, detect_input=None):
+        # detect_input is handed to the detector instead of frame, e.g. a FrameBus frame with a ready model input
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, None, fx=self.flow_scale, fy=self.flow_scale, interpolation=cv2.INTER_AREA)
+
+        self.detected = (self.boxes is None or self.frames_since_detection + 1 >= self.interval
+                         or self.confidence < self.min_confidence)
+        if self.detected:
+            start = time.perf_counter()
+            detected = self.detect(frame if detect_input is None else detect_input)
+            self.boxes = np.asarray(detected, dtype=np.float32).reshape(-1, 6)
+            self.adapt_interval(time.perf_counter() - start)
+            self.points = [self.seed_points(gray, box) for box in self.boxes]
+            self.frames_since_detection = 0
+            self.confidence = 1.0
+        else:
+            self.propagate(gray)
+            self.frames_since_detection += 1
+
+        self.prev_gray = gray
+        return self.boxes.copy()
+
+    def adapt_interval(self, elapsed):
+        if self.inference_time is None:
+            self.inference_time = elapsed
+        else:
+            self.inference_time = 0.8 * self.inference_time + 0.2 * elapsed
+        budget = 1.0 / self.target_fps
+        self.interval = int(min(self.max_interval, max(1, math.ceil(self.inference_time / budget))))
+
+    def seed_points(self, gray, box):
+        s = self.flow_scale
+        h, w = gray.shape
+        x1, y1 = int(max(0, box[0] * s)), int(max(0, box[1] * s))
+        x2, y2 = int(min(w, box[2] * s)), int(min(h, box[3] * s))
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return np.empty((0, 1, 2), np.float32)
+
+        points = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], maxCorners=20, qualityLevel=0.01, minDistance=3)
+        if points is None:
+            # Flat region, fall back to a coarse grid inside the box
+            xs, ys = np.meshgrid(np.linspace(0, x2 - x1 - 1, 3), np.linspace(0, y2 - y1 - 1, 3))
+            points = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+        return (points + np.array([x1, y1])).astype(np.float32)
+
+    def propagate(self, gray):
+        counts = [len(p) for p in self.points]
+        if not counts or sum(counts) == 0:
+            self.confidence = 0.0 if len(self.boxes) else 1.0
+            return
+
+        # One forward and one backward pass over the points of all boxes
+        prev = np.concatenate(self.points)
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, prev, None, winSize=(15, 15), maxLevel=2)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, nxt, None, winSize=(15, 15), maxLevel=2)
+        error = np.linalg.norm((prev - back).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < 1.0)
+
+        confidences = []
+        start = 0
+        for i, count in enumerate(counts):
+            end = start + count
+            keep = good[start:end]
+            old, new = prev[start:end][keep].reshape(-1, 2), nxt[start:end][keep].reshape(-1, 2)
+            start = end
+
+            confidences.append(keep.mean() if count else 0.0)
+            if len(new) < 3:
+                self.points[i] = new.reshape(-1, 1, 2)
+                continue
+
+            # Median shift and median change of spread around the centre give the new box
+            shift = np.median(new - old, axis=0) / self.flow_scale
+            old_spread = np.linalg.norm(old - np.median(old, axis=0), axis=1)
+            new_spread = np.linalg.norm(new - np.median(new, axis=0), axis=1)
+            valid = old_spread > 1e-3
+            scale = float(np.median(new_spread[valid] / old_spread[valid])) if valid.any() else 1.0
+
+            x1, y1, x2, y2 = self.boxes[i, :4]
+            cx, cy = (x1 + x2) / 2 + shift[0], (y1 + y2) / 2 + shift[1]
+            hw, hh = (x2 - x1) / 2 * scale, (y2 - y1) / 2 * scale
+            self.boxes[i, :4] = (cx - hw, cy - hh, cx + hw, cy + hh)
+            self.points[i] = new.reshape(-1, 1, 2)
+
+        self.confidence = float(min(confidences))
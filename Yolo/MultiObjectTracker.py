@@ -0,0 +1,189 @@
+import threading
+
+import numpy as np
+
+
+def box_iou(box1, box2, eps=1e-7):
+    # NumPy port of utils/metrics.box_iou from the bundled yolov5, without the torch overhead for a few boxes
+    """
+    Return intersection-over-union (Jaccard index) of boxes.
+
+    Both sets of boxes are expected to be in (x1, y1, x2, y2) format.
+    Arguments:
+        box1 (ndarray[N, 4])
+        box2 (ndarray[M, 4])
+    Returns:
+        iou (ndarray[N, M]): the NxM matrix containing the pairwise
+            IoU values for every element in boxes1 and boxes2
+    """
+    a1, a2 = box1[:, None, :2], box1[:, None, 2:]
+    b1, b2 = box2[None, :, :2], box2[None, :, 2:]
+    inter = (np.minimum(a2, b2) - np.maximum(a1, b1)).clip(0).prod(2)
+    return inter / ((a2 - a1).prod(2) + (b2 - b1).prod(2) - inter + eps)
+
+
+def greedy_match(iou, threshold):
+    # Take pairs best first; only the few pairs above the threshold are ever visited
+    rows, cols = np.nonzero(iou >= threshold)
+    pairs = []
+    used_rows, used_cols = set(), set()
+    for k in np.argsort(-iou[rows, cols], kind='stable'):
+        r, c = rows[k], cols[k]
+        if r in used_rows or c in used_cols:
+            continue
+        pairs.append((r, c))
+        used_rows.add(r)
+        used_cols.add(c)
+    return pairs
+
+
+class MultiObjectTracker:
+    """
+    ByteTrack-style tracker that gives detections stable IDs across frames.
+
+    Tracks are predicted with a constant velocity and associated by IoU, first
+    with the confident detections, then the remaining tracks with the weak ones
+    (which are never used to start new tracks). Tracks survive max_age frames
+    without a match, so a briefly occluded person keeps their ID.
+
+    Rows are returned as (x1, y1, x2, y2, conf, cls, id).
+    update() may run on a detection thread while the UI cycles the lock and
+    draws, so every public method holds the tracker's lock.
+    """
+
+    def __init__(self, classes=(0,), high_conf=0.5, low_conf=0.1, match_iou=0.3, low_match_iou=0.5,
+                 max_age=15, min_hits=2):
+        self.classes = classes  # Only these classes are tracked, None tracks everything
+        self.high_conf = high_conf
+        self.low_conf = low_conf
+        self.match_iou = match_iou
+        self.low_match_iou = low_match_iou
+        self.max_age = max_age
+        self.min_hits = min_hits
+
+        self.boxes = np.zeros((0, 4), np.float32)
+        self.velocity = np.zeros((0, 4), np.float32)
+        self.conf = np.zeros(0, np.float32)
+        self.cls = np.zeros(0, np.float32)
+        self.ids = np.zeros(0, np.int64)
+        self.hits = np.zeros(0, np.int64)
+        self.misses = np.zeros(0, np.int64)
+        self.next_id = 1
+        self.locked_id = None
+        self._lock = threading.Lock()
+
+    def update(self, detections):
+        with self._lock:
+            return self._update(detections)
+
+    def _update(self, detections):
+        dets = np.asarray(detections, np.float32).reshape(-1, 6)
+        if self.classes is not None:
+            dets = dets[np.isin(dets[:, 5], self.classes)]
+        dets = dets[dets[:, 4] >= self.low_conf]
+
+        # Predict where every track is now
+        last = self.boxes
+        self.boxes = self.boxes + self.velocity
+
+        high = np.flatnonzero(dets[:, 4] >= self.high_conf)
+        low = np.flatnonzero(dets[:, 4] < self.high_conf)
+        matched = np.zeros(len(self.boxes), bool)
+
+        # First pass: confident detections against all tracks
+        pairs = [(t, high[d]) for t, d in greedy_match(box_iou(self.boxes, dets[high, :4]), self.match_iou)]
+        for t, _ in pairs:
+            matched[t] = True
+
+        # Second pass: weak detections keep the remaining tracks alive
+        rest = np.flatnonzero(~matched)
+        for t, d in greedy_match(box_iou(self.boxes[rest], dets[low, :4]), self.low_match_iou):
+            pairs.append((rest[t], low[d]))
+            matched[rest[t]] = True
+
+        if pairs:
+            t, d = np.array(pairs).T
+            self.velocity[t] = 0.5 * self.velocity[t] + 0.5 * (dets[d, :4] - last[t])
+            self.boxes[t] = dets[d, :4]
+            self.conf[t] = dets[d, 4]
+            self.cls[t] = dets[d, 5]
+            self.hits[t] += 1
+            self.misses[t] = 0
+
+        self.misses[~matched] += 1
+        self.velocity[~matched] *= 0.5  # Do not let lost tracks drift away
+
+        # Unmatched confident detections start new tracks
+        used = np.zeros(len(dets), bool)
+        for _, d in pairs:
+            used[d] = True
+        new = high[~used[high]]
+        if len(new):
+            self.boxes = np.concatenate([self.boxes, dets[new, :4]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((len(new), 4), np.float32)])
+            self.conf = np.concatenate([self.conf, dets[new, 4]])
+            self.cls = np.concatenate([self.cls, dets[new, 5]])
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + len(new))])
+            self.hits = np.concatenate([self.hits, np.ones(len(new), np.int64)])
+            self.misses = np.concatenate([self.misses, np.zeros(len(new), np.int64)])
+            self.next_id += len(new)
+
+        # Forget tracks that have been lost for too long
+        alive = self.misses <= self.max_age
+        if not alive.all():
+            self.boxes, self.velocity = self.boxes[alive], self.velocity[alive]
+            self.conf, self.cls, self.ids = self.conf[alive], self.cls[alive], self.ids[alive]
+            self.hits, self.misses = self.hits[alive], self.misses[alive]
+
+        return self._visible()
+
+    def visible(self):
+        with self._lock:
+            return self._visible()
+
+    def _visible(self):
+        # Tracks matched in the latest frame that have been seen often enough to trust
+        keep = (self.misses == 0) & (self.hits >= self.min_hits)
+        return np.concatenate([self.boxes[keep], self.conf[keep, None], self.cls[keep, None],
+                               self.ids[keep, None].astype(np.float32)], axis=1)
+
+    def lock(self, track_id):
+        with self._lock:
+            self.locked_id = track_id
+
+    def cycle_lock(self):
+        # Move the lock to the next visible ID
+        with self._lock:
+            self._cycle_lock()
+
+    def _cycle_lock(self):
+        ids = sorted(int(i) for i in self._visible()[:, 6])
+        if not ids:
+            return
+        later = [i for i in ids if self.locked_id is None or i > self.locked_id]
+        self.locked_id = later[0] if later else ids[0]
+
+    def target(self):
+        """
+        Row of the locked track, or None while it is not visible.
+        When the locked track is gone for good (or nothing is locked yet) the lock
+        moves to the largest visible track.
+        """
+        with self._lock:
+            return self._target()
+
+    def _target(self):
+        rows = self._visible()
+        if self.locked_id is not None:
+            row = rows[rows[:, 6] == self.locked_id]
+            if len(row):
+                return row[0]
+            if self.locked_id in self.ids:
+                return None  # Briefly lost, do not switch to somebody else yet
+        if not len(rows):
+            self.locked_id = None
+            return None
+        areas = (rows[:, 2] - rows[:, 0]) * (rows[:, 3] - rows[:, 1])
+        row = rows[np.argmax(areas)]
+        self.locked_id = int(row[6])
+        return row
@@ -1,9 +1,27 @@
 import torch
 from djitellopy import Tello
 import cv2
+import numpy as np
 import pygame
+import sys
+import time
+from pathlib import Path
+from threading import Thread
 from pygame.locals import *
 
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon.DisplaySink import DisplaySink
+from DroneCommon.FrameBus import FrameBus
+from DroneCommon.FrameTrace import FrameTracer
+from DroneCommon.PID import PID
+from DroneCommon.TextSprites import TextSpriteCache
+from HybridDetector import HybridDetector
+from MultiObjectTracker import MultiObjectTracker
+
 
 def load_yolo_model():
     model = torch.hub.load('ultralytics/yolov5', 'yolov5s')  # Smallest YOLOv5 model
@@ -17,58 +35,123 @@ class FrontEnd:
         self.model = load_yolo_model()
         self.hud_size = (960, 720)  # Set size to your preference
         self.screen = pygame.display.set_mode(self.hud_size)
+        self.display = DisplaySink(self.screen, 'BGR')  # Copies frames into one persistent surface
+        self.text = TextSpriteCache()  # Box labels are rasterised once per id and colour
         pygame.display.set_caption("Drone with YOLO Object Tracking")
         self.tracking_enabled = False  # Tracking state
+        self.hybrid_detection = True  # Run YOLO every N frames, optical flow in between
+        self.detector = HybridDetector(self.infer)
+        self.tracker = MultiObjectTracker()  # Stable person IDs, the drone follows the locked one
+        self.tracks = []  # Tracks of the latest frame, drawn over the display
+        self.bus = None  # Converts every camera frame once for both the display and the model
+
+        # Follow mode: 'rc' sends continuous velocities from a fixed-rate control thread,
+        # 'step' issues the blocking move_* commands from the frame loop
+        self.control_mode = 'rc'
+        self.control_rate = 20  # rc control ticks per second
+        self.target_timeout = 0.5  # Seconds without a detection before the drone holds position
+        self.pid_yaw = PID(kp=60, kd=10, limit=60)  # Horizontal centre error -> yaw velocity
+        self.pid_up_down = PID(kp=50, kd=5, limit=50)  # Vertical centre error -> up/down velocity
+        self.pid_for_back = PID(kp=40, ki=5, limit=40)  # Area error -> forward/backward velocity
+        self.target = None  # (seq, error_x, error_y, error_area, time, frame_id) of the latest detection
+        self.rc_active = False
+        self.running = False
+        self.tracer = FrameTracer('yolo_control')
 
     def run(self):
         self.tello.connect()
         self.tello.streamon()
         print(self.tello.get_battery())
         frame_read = self.tello.get_frame_read()
+        self.bus = FrameBus(frame_read, self.hud_size)
+        self.bus.start()
 
-        running = True
-        while running:
+        self.running = True
+        control_thread = Thread(target=self.rc_control_loop, daemon=True)
+        control_thread.start()
+
+        seq = 0
+        while self.running:
             for event in pygame.event.get():
                 if event.type == KEYDOWN:
                     if event.key == K_ESCAPE:
-                        running = False
+                        self.running = False
                     elif event.key == K_TAB:
                         self.tello.takeoff()
                     elif event.key == K_LSHIFT:
                         self.tello.land()
                     elif event.key == K_t:
                         self.tracking_enabled = not self.tracking_enabled  # Toggle tracking
+                    elif event.key == K_m:
+                        self.control_mode = 'step' if self.control_mode == 'rc' else 'rc'  # Toggle follow mode
+                        print("Control mode:", self.control_mode)
+                    elif event.key == K_l:
+                        self.tracker.cycle_lock()  # Follow the next person
 
-            frame = frame_read.frame
-            frame = cv2.resize(frame, self.hud_size)
-            results = self.detect_objects(frame)
-            if self.tracking_enabled:
-                self.control_drone(results)
+            # Only new frames are processed, the timeout keeps the window responsive while none arrive
+            frame = self.bus.wait(seq, timeout=1 / 30)
+            if frame is not None:
+                seq = frame.seq
+                # Trace from when the frame reader produced the frame, the bus did the preprocessing
+                frame_id = self.tracer.begin(at=frame.captured)
+                self.tracer.stamp(frame_id, 'preprocess', at=frame.converted)
+                self.tracks = self.detect_objects(frame)
+                self.tracer.stamp(frame_id, 'inference')
+                if self.tracking_enabled:
+                    target = self.select_target()
+                    self.tracer.stamp(frame_id, 'decision')
+                    if self.control_mode == 'step':
+                        if len(target):
+                            self.tracer.stamp(frame_id, 'command')
+                        self.control_drone(target)
+                    else:
+                        self.update_target(target, frame_id)  # Picked up by the control thread, never blocks
 
-            # Convert frame to Pygame surface to display it
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = frame.swapaxes(0, 1)
-            frame = pygame.surfarray.make_surface(frame)
-            self.screen.blit(frame, (0, 0))
-            pygame.display.update()
+                self.display.show(frame.display, self.draw_tracks)
+                frame.release()
 
             if cv2.waitKey(1) & 0xFF == ord('q'):
-                running = False
+                self.running = False
 
+        control_thread.join()
+        self.bus.stop()
+        print(self.bus.report())
+        print(self.tracer.summary())
+        self.tracer.dump()
         self.tello.end()
         cv2.destroyAllWindows()
         pygame.quit()
 
+    def infer(self, frame):
+        # frame is a FrameBus frame: the input is already letterboxed RGB at the model size, so AutoShape's own
+        # resize is a no-op; boxes come back in model coordinates and are mapped to the display
+        results = self.model([frame.model_input], size=max(frame.model_input.shape[:2]))
+        return frame.to_display(results.xyxy[0].to('cpu').numpy())  # Extract predictions
+
     def detect_objects(self, frame):
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.model([img])
-        results = results.xyxy[0].to('cpu').numpy()  # Extract predictions
-        for det in results:
-            if int(det[5]) == 0:  # Class ID for 'person'
-                x1, y1, x2, y2, conf, cls = map(int, det[:6])
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, 'Person', (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-        return results
+        if self.hybrid_detection:
+            results = self.detector(frame.display, frame)  # Detected or interpolated boxes, same layout
+        else:
+            results = self.infer(frame)
+        tracks = self.tracker.update(results)
+        self.tracker.target()  # Make sure something is locked before drawing
+        return tracks
+
+    def draw_tracks(self, frame):
+        # Drawn on the display surface, the shared camera frame is never modified
+        for det in self.tracks:
+            x1, y1, x2, y2 = map(int, det[:4])
+            track_id = int(det[6])
+            color = (0, 0, 255) if track_id == self.tracker.locked_id else (0, 255, 0)  # Locked person in red
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            self.text.put(frame, f'Person {track_id}', (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+
+    def select_target(self):
+        # The locked track as a one-row (x1, y1, x2, y2, conf, cls) array, empty while it is not visible
+        target = self.tracker.target()
+        if target is None:
+            return np.zeros((0, 6), np.float32)
+        return target[None, :6]
 
     def calculate_dynamic_distance(self, size_error, desired_area):
         # Ensure there's no division by zero
@@ -81,11 +164,70 @@ class FrontEnd:
         move_distance = int(max(20, min(100, proportion_of_error * 250)))  # Adjust scale factor as needed
         return move_distance
 
+    def update_target(self, detections, frame_id=None):
+        if len(detections) == 0:
+            return  # Keep the old target, it times out in the control thread
+
+        # Only the locked target is passed in
+        x1, y1, x2, y2, conf, cls = detections[0]
+        desired_area = 0.40 * self.hud_size[0] * self.hud_size[1]
+
+        # Errors normalised to the frame so the PID gains do not depend on the hud size
+        error_x = ((x1 + x2) / 2 - self.hud_size[0] / 2) / (self.hud_size[0] / 2)
+        error_y = ((y1 + y2) / 2 - self.hud_size[1] / 2) / (self.hud_size[1] / 2)
+        error_area = ((x2 - x1) * (y2 - y1) - desired_area) / desired_area
+
+        seq = self.target[0] + 1 if self.target else 1
+        self.target = (seq, error_x, error_y, error_area, time.monotonic(), frame_id)
+
+    def rc_control_loop(self):
+        # Fixed-rate tick, independent of how fast detection runs
+        period = 1 / self.control_rate
+        next_tick = time.monotonic()
+        last_seq = 0
+        while self.running:
+            last_seq = self.rc_control_tick(period, last_seq)
+
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()  # Fell behind, do not try to catch up in a burst
+
+    def rc_control_tick(self, dt, last_seq):
+        if not self.tracking_enabled or self.control_mode != 'rc':
+            if self.rc_active:
+                self.stop_rc()
+            return last_seq
+
+        target = self.target
+        if target is None or time.monotonic() - target[4] > self.target_timeout:
+            self.stop_rc()  # Lost the target, hover in place
+            return last_seq
+
+        seq, error_x, error_y, error_area, _, frame_id = target
+        fresh = seq != last_seq
+        yaw = self.pid_yaw.update(error_x, dt, fresh)
+        up_down = self.pid_up_down.update(-error_y, dt, fresh)  # Target below centre -> descend
+        for_back = self.pid_for_back.update(-error_area, dt, fresh)  # Target too large -> back off
+
+        self.tello.send_rc_control(0, int(for_back), int(up_down), int(yaw))
+        self.tracer.stamp(frame_id, 'command')
+        self.rc_active = True
+        return seq
+
+    def stop_rc(self):
+        self.tello.send_rc_control(0, 0, 0, 0)
+        for pid in (self.pid_yaw, self.pid_up_down, self.pid_for_back):
+            pid.reset()
+        self.rc_active = False
+
     def control_drone(self, detections):
         if len(detections) == 0:
             return  # If no objects detected, no movement needed
 
-        # Assuming we track the first detected object for simplicity
+        # Only the locked target is passed in
         det = detections[0]
         x1, y1, x2, y2, conf, cls = det
         center_x = (x1 + x2) / 2
@@ -1,10 +1,26 @@
 import torch
 import cv2
+import numpy as np
 import pygame
 from pygame.locals import *
 from djitellopy import Tello
 from threading import Thread
+import sys
 import time
+from pathlib import Path
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # repository root
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from DroneCommon.CommandScheduler import CommandScheduler
+from DroneCommon.DisplaySink import DisplaySink
+from DroneCommon.FrameBus import FrameBus
+from DroneCommon.FrameTrace import FrameTracer
+from DroneCommon.TextSprites import TextSpriteCache
+from HybridDetector import HybridDetector
+from MultiObjectTracker import MultiObjectTracker
 
 
 def calculate_dynamic_distance(size_error, desired_area):
@@ -25,21 +41,34 @@ class FrontEnd:
         self.model = load_yolo_model()
         self.hud_size = (960, 720)
         self.screen = pygame.display.set_mode(self.hud_size)
+        self.display = DisplaySink(self.screen, 'BGR')  # Resizes frames straight into one persistent surface
+        self.text = TextSpriteCache()  # Box labels are rasterised once per id and colour
         pygame.display.set_caption("Drone with YOLO Object Tracking")
         self.tracking_enabled = False
         self.run_thread = True
         self.detections = []  # Store detection results
+        self.commands = CommandScheduler()  # Single worker owning the Tello command socket
+        self.hybrid_detection = True  # Run YOLO every N frames, optical flow in between
+        self.detector = HybridDetector(self.infer)
+        self.tracker = MultiObjectTracker()  # Stable person IDs, the drone follows the locked one
+        self.tracer = FrameTracer('yolo_tracking')
+        self.trace_id = None  # Traced frame the pending control decision belongs to
+        self.bus = None  # Converts every camera frame once for both the display and the detector
 
     def run(self):
         self.tello.connect()
         self.tello.streamon()
         print(self.tello.get_battery())
         frame_read = self.tello.get_frame_read()
+        self.bus = FrameBus(frame_read, self.hud_size)
+        self.bus.start()
 
+        self.commands.start()
         control_thread = Thread(target=self.control_loop)
         control_thread.start()
 
         running = True
+        seq = 0
         while running:
             for event in pygame.event.get():
                 if event.type == KEYDOWN:
@@ -47,58 +76,99 @@ class FrontEnd:
                         running = False
                         self.run_thread = False
                     elif event.key == K_TAB:
-                        Thread(target=self.tello.takeoff).start()
+                        self.commands.submit_priority('takeoff', self.tello.takeoff)
                     elif event.key == K_LSHIFT:
-                        Thread(target=self.tello.land).start()
+                        self.commands.submit_priority('land', self.tello.land)
+                    elif event.key == K_e:
+                        # Motors off at once, without waiting for a move in flight
+                        self.tracking_enabled = False
+                        self.commands.emergency('emergency', self.tello.emergency)
                     elif event.key == K_t:
                         self.tracking_enabled = not self.tracking_enabled
+                    elif event.key == K_l:
+                        self.tracker.cycle_lock()  # Follow the next person
 
-            if frame_read.frame is not None:
-                frame = frame_read.frame
-                frame = cv2.resize(frame, self.hud_size)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                # Draw detections from the latest frame
-                for det in self.detections:
-                    x1, y1, x2, y2, conf, cls = map(int, det[:6])
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.putText(frame, 'Person', (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-
-                frame = frame.swapaxes(0, 1)
-                frame = pygame.surfarray.make_surface(frame)
-                self.screen.blit(frame, (0, 0))
-                pygame.display.update()
-            else:
-                print("No frame received from drone camera")
+            # Redraw only when a new frame arrived, the timeout keeps the window responsive meanwhile
+            frame = self.bus.wait(seq, timeout=1 / 60)
+            if frame is not None:
+                seq = frame.seq
+                self.display.show(frame.display, self.draw_detections)
+                frame.release()
 
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 running = False
 
+        self.run_thread = False
+        control_thread.join()
+        self.bus.stop()
+        print(self.bus.report())
+        self.commands.stop()
+        print(self.commands.report())
+        print(self.tracer.summary())
+        self.tracer.dump()
         self.tello.end()
         cv2.destroyAllWindows()
         pygame.quit()
 
+    def draw_detections(self, frame):
+        # Draw detections from the latest frame, frame is BGR
+        for det in self.detections:
+            x1, y1, x2, y2, conf, cls, track_id = map(int, det[:7])
+            color = (0, 0, 255) if track_id == self.tracker.locked_id else (0, 255, 0)  # Locked person in red
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            self.text.put(frame, f'Person {track_id}', (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+
     def control_loop(self):
+        seq = 0
         while self.run_thread:
             if self.tracking_enabled:
-                frame_read = self.tello.get_frame_read()
-                frame = frame_read.frame
-                frame = cv2.resize(frame, self.hud_size)
+                frame = self.bus.wait(seq, timeout=0.1)  # Never re-detects a frame it already saw
+                if frame is None:
+                    continue
+                seq = frame.seq
+                # Trace from when the frame reader produced the frame, the bus did the preprocessing
+                frame_id = self.tracer.begin(at=frame.captured)
+                self.tracer.stamp(frame_id, 'preprocess', at=frame.converted)
                 results = self.detect_objects(frame)
-                self.detections = results  # Update global detection results
-                self.control_drone(results)
-            time.sleep(0.1)  # Reduce CPU load
+                frame.release()
+                self.tracer.stamp(frame_id, 'inference')
+                self.detections = self.tracker.update(results)  # Update global tracks
+                target = self.select_target()
+                self.tracer.stamp(frame_id, 'decision')
+                self.trace_id = frame_id
+                self.control_drone(target)
+                if not self.hybrid_detection:
+                    time.sleep(0.1)  # Reduce CPU load
+            else:
+                time.sleep(0.1)  # Reduce CPU load
 
-    def detect_objects(self, frame):
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.model([img])
-        results = results.xyxy[0].to('cpu').numpy()
+    def infer(self, frame):
+        # frame is a FrameBus frame: the input is already letterboxed RGB at the model size, so AutoShape's own
+        # resize is a no-op; boxes come back in model coordinates and are mapped to the display
+        results = self.model([frame.model_input], size=max(frame.model_input.shape[:2]))
+        results = frame.to_display(results.xyxy[0].to('cpu').numpy())
         return results
 
+    def detect_objects(self, frame):
+        if self.hybrid_detection:
+            return self.detector(frame.display, frame)  # Detected or interpolated boxes, same layout
+        return self.infer(frame)
+
+    def select_target(self):
+        # The locked track as a one-row (x1, y1, x2, y2, conf, cls) array, empty while it is not visible
+        target = self.tracker.target()
+        if target is None:
+            return np.zeros((0, 6), np.float32)
+        return target[None, :6]
+
+    def submit(self, slot, name, function, *args):
+        # Stamp the traced frame when the scheduler actually sends the command
+        self.commands.submit(slot, name, self.tracer.wrap(self.trace_id, function), *args)
+
     def control_drone(self, detections):
         if len(detections) == 0:
             return
-        det = detections[0]
+        det = detections[0]  # Only the locked target is passed in
         x1, y1, x2, y2, conf, cls = det
         center_x = (x1 + x2) / 2
         center_y = (y1 + y2) / 2
@@ -121,21 +191,21 @@ class FrontEnd:
         if abs(size_error) > threshold_area:
             move_distance = calculate_dynamic_distance(size_error, desired_area)
             if size_error > 0:
-                Thread(target=self.tello.move_back, args=(move_distance,)).start()
+                self.submit('depth', 'move_back', self.tello.move_back, move_distance)
             else:
-                Thread(target=self.tello.move_forward, args=(move_distance,)).start()
+                self.submit('depth', 'move_forward', self.tello.move_forward, move_distance)
 
     def adjust_horizontal_vertical_movement(self, error_x, error_y, threshold_x, threshold_y):
         if abs(error_x) > threshold_x:
             if error_x < 0:
-                Thread(target=self.tello.move_left, args=(25,)).start()
+                self.submit('horizontal', 'move_left', self.tello.move_left, 25)
             else:
-                Thread(target=self.tello.move_right, args=(25,)).start()
+                self.submit('horizontal', 'move_right', self.tello.move_right, 25)
         if abs(error_y) > threshold_y:
             if error_y < 0:
-                Thread(target=self.tello.move_up, args=(20,)).start()
+                self.submit('vertical', 'move_up', self.tello.move_up, 20)
             else:
-                Thread(target=self.tello.move_down, args=(20,)).start()
+                self.submit('vertical', 'move_down', self.tello.move_down, 20)
 
 
 if __name__ == '__main__':